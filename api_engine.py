@@ -0,0 +1,536 @@
+import os
+import re
+import json
+import time
+import asyncio
+import difflib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qsl, quote
+
+from playwright.async_api import async_playwright
+
+from gr_index import CACHE_DIR
+from preflight import PLAN_COLUMNS
+
+# A learned call is used only once this many recordings agree on it, so a
+# value that merely happened to be the same in one row is never frozen in.
+CONFIRMATIONS = 2
+
+MUTATING_METHODS = ("POST", "PUT", "PATCH")
+
+# Calls per second across all workers, to stay as gentle on the portal as the browser is.
+DEFAULT_RATE = 5.0
+
+# A learned call counts as trusted once this many of its rows passed the
+# browser check; until then more of its rows are checked per run.
+VERIFIED_TO_TRUST = 10
+
+# Auth tokens shorter than this are not looked for in request headers.
+MIN_TOKEN_LENGTH = 16
+
+# The sheet columns the browser enters for each Admission Type (see
+# bot.process_row). A value in a learned body that no column explains may
+# still depend on one of these, so it is trusted only once rows that differed
+# in them sent the same call.
+ROW_INPUTS = {
+    "New Admission": tuple(c for c in PLAN_COLUMNS if c != "Admission Type"),
+    "Promoted": ("Select Section",),
+    "Retained": ("Select Section",),
+    "Passout": (),
+    "Dropout": (),
+    "TC": (),
+}
+
+
+def profile_path(base_url: str):
+    host = re.sub(r"[^A-Za-z0-9_.-]", "_", urlsplit(base_url).hostname or "") or "default"
+    return os.path.join(CACHE_DIR, f"api_profile_{host}.json")
+
+
+class SessionLost(Exception):
+    """The portal answered 401: the session has to be renewed in the browser."""
+
+
+class CallRecorder:
+    """Collects the XHR/fetch calls a browser context makes to the portal's backend."""
+
+    def __init__(self, context):
+        self._requests = []
+        self._lock = threading.Lock()
+        context.on("requestfinished", self._on_request)
+
+    def _on_request(self, request):
+        if request.resource_type in ("xhr", "fetch"):
+            with self._lock:
+                self._requests.append(request)
+
+    def clear(self):
+        with self._lock:
+            self._requests = []
+
+    def take(self):
+        """Return and forget the calls seen so far, as plain dicts."""
+        with self._lock:
+            requests, self._requests = self._requests, []
+        calls = []
+        for request in requests:
+            try:
+                response = request.response()
+            except Exception:
+                continue
+            try:
+                body = request.post_data_json if request.post_data else None
+            except Exception:
+                body = None
+            try:
+                payload = response.json() if response is not None and request.method == "GET" else None
+            except Exception:
+                payload = None
+            calls.append({
+                "method": request.method,
+                "url": request.url,
+                "headers": request.headers,
+                "body": body,
+                "status": response.status if response is not None else None,
+                "response": payload,
+            })
+        return calls
+
+
+def _normalize(name: str):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def _body_template(value, row, key="", photo=None):
+    """Replace the row's values inside a recorded JSON body by references to their columns."""
+    if isinstance(value, dict):
+        return {k: _body_template(v, row, k, photo) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_body_template(v, row, key, photo) for v in value]
+    if value is None or isinstance(value, bool):
+        return value
+    text = str(value).strip()
+    if photo and text == os.path.basename(photo):
+        return {"$photo": True}
+    matches = [c for c in PLAN_COLUMNS if row.get(c) is not None and str(row[c]).strip() == text]
+    if not matches:
+        return value
+    # Short values ("A", "NO") can sit in several columns; trust the most similar name.
+    column = max(matches, key=lambda c: difflib.SequenceMatcher(None, _normalize(key), _normalize(c)).ratio())
+    return {"$column": column, "$type": type(value).__name__}
+
+
+def _constants(template):
+    """True when a body template still holds a row-sized value no column explains."""
+    if isinstance(template, dict):
+        if "$column" in template or "$photo" in template:
+            return False
+        return any(_constants(v) for v in template.values())
+    if isinstance(template, list):
+        return any(_constants(v) for v in template)
+    return template is not None and not isinstance(template, bool)
+
+
+def _has_photo(template):
+    """True when a body template refers to the row's photo file."""
+    if isinstance(template, dict):
+        return "$photo" in template or any(_has_photo(v) for v in template.values())
+    if isinstance(template, list):
+        return any(_has_photo(v) for v in template)
+    return False
+
+
+def _columns(template):
+    """The plan columns a body template refers to."""
+    if isinstance(template, dict):
+        if "$column" in template:
+            return {template["$column"]}
+        return set().union(*(_columns(v) for v in template.values()))
+    if isinstance(template, list):
+        return set().union(*(_columns(v) for v in template))
+    return set()
+
+
+def _render_body(template, row, photo=None):
+    if isinstance(template, dict):
+        if "$column" in template:
+            value = row.get(template["$column"])
+            if value is None:
+                return None
+            if template["$type"] == "int":
+                return int(value)
+            if template["$type"] == "float":
+                return float(value)
+            return str(value)
+        if "$photo" in template:
+            return os.path.basename(photo) if photo else None
+        return {k: _render_body(v, row, photo) for k, v in template.items()}
+    if isinstance(template, list):
+        return [_render_body(v, row, photo) for v in template]
+    return template
+
+
+def _url_template(url: str, gr_no, student_id=None):
+    """Path and query of a recorded URL with the GR NO and student id made placeholders."""
+    parts = urlsplit(url)
+    placeholders = {str(gr_no): "{gr_no}"}
+    if student_id is not None:
+        placeholders[str(student_id)] = "{student_id}"
+    path = "/".join(placeholders.get(segment, segment) for segment in parts.path.split("/"))
+    query = "&".join(
+        f"{quote(k)}={placeholders.get(v) or quote(v)}" for k, v in parse_qsl(parts.query, keep_blank_values=True)
+    )
+    return path + (f"?{query}" if query else "")
+
+
+def _render_url(template: str, gr_no, student_id=None):
+    url = template.replace("{gr_no}", quote(str(gr_no)))
+    if student_id is not None:
+        url = url.replace("{student_id}", quote(str(student_id)))
+    return url.lstrip("/")
+
+
+def _find_record(payload, gr_no, student_id):
+    """The (gr_key, id_key) of the object in a JSON response that describes the student."""
+    if isinstance(payload, list):
+        for item in payload:
+            found = _find_record(item, gr_no, student_id)
+            if found:
+                return found
+    elif isinstance(payload, dict):
+        gr_key = next((k for k, v in payload.items() if str(v) == str(gr_no)), None)
+        id_key = next((k for k, v in payload.items() if str(v) == str(student_id)), None)
+        if gr_key and id_key:
+            return gr_key, id_key
+        for value in payload.values():
+            found = _find_record(value, gr_no, student_id)
+            if found:
+                return found
+    return None
+
+
+def _find_student_id(payload, gr_no, gr_key, id_key):
+    if isinstance(payload, list):
+        for item in payload:
+            found = _find_student_id(item, gr_no, gr_key, id_key)
+            if found is not None:
+                return found
+    elif isinstance(payload, dict):
+        if str(payload.get(gr_key)) == str(gr_no) and id_key in payload:
+            return payload[id_key]
+        for value in payload.values():
+            found = _find_student_id(value, gr_no, gr_key, id_key)
+            if found is not None:
+                return found
+    return None
+
+
+def _storage_items(session):
+    """(store, key, value) of every localStorage and sessionStorage item of a saved session."""
+    for origin in session.get("storage_state", {}).get("origins", []):
+        for item in origin.get("localStorage", []):
+            yield "local", item["name"], item["value"]
+    for key, value in session.get("session_storage", {}).get("items", {}).items():
+        yield "session", key, value
+
+
+def student_id_from_route(route):
+    """The student id in a detail route such as /student/about/123."""
+    found = re.findall(r"\d+", route or "")
+    return found[-1] if found else None
+
+
+class ApiProfile:
+    """Backend calls learned from the browser, replayed by the ApiEngine.
+
+    actions maps an Admission Type to the call that applies such a row, as a
+    method, a URL template and a JSON body whose row values refer to plan
+    columns. lookup is the search call that turns a GR NO into the student
+    id used in status URLs, and auth says which stored token, if any, the
+    portal sends in a header next to its cookies. Saved per portal host.
+    """
+
+    def __init__(self, base_url: str, path=None):
+        self.path = path or profile_path(base_url)
+        self.actions = {}
+        self.lookup = None
+        self.auth = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.actions = saved.get("actions", {})
+        self.lookup = saved.get("lookup")
+        self.auth = saved.get("auth")
+
+    def save(self):
+        with self._lock:
+            saved = {"actions": self.actions, "lookup": self.lookup, "auth": self.auth}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def ready(self, admission_type):
+        """True when rows of this type can be sent without the browser.
+
+        A body with constants also needs the confirming rows to have differed
+        in every input column the body does not refer to: a section id that
+        two rows of section A agreed on would send section C rows to A.
+        """
+        action = self.actions.get(admission_type)
+        if not action or action["confirmations"] < CONFIRMATIONS:
+            return False
+        if "{student_id}" in action["url"] and self.lookup is None:
+            return False
+        # Only JSON calls are replayed; the photo itself (or any other file)
+        # went up in an upload call, so such a row still needs the browser.
+        if action.get("uploads") or _has_photo(action["body"]):
+            return False
+        if _constants(action["body"]):
+            seen = action.get("seen", {})
+            return all(len(seen.get(c, ())) >= 2 for c in self._unexplained(admission_type, action))
+        return True
+
+    @staticmethod
+    def _unexplained(admission_type, action):
+        inputs = ROW_INPUTS.get(admission_type, PLAN_COLUMNS)
+        return [c for c in inputs if c not in _columns(action["body"])]
+
+    def _witness(self, action, row):
+        """Remember the row's values of the input columns the action's body leaves unexplained."""
+        seen = action.setdefault("seen", {})
+        for column in self._unexplained(row["Admission Type"], action):
+            value = str(row.get(column))
+            values = seen.setdefault(column, [])
+            if value not in values and len(values) < 2:
+                values.append(value)
+
+    def trusted(self, admission_type):
+        action = self.actions.get(admission_type)
+        return bool(action) and action.get("verified", 0) >= VERIFIED_TO_TRUST
+
+    def verified(self, admission_type):
+        """Count a row of this type that the browser found applied in the portal."""
+        with self._lock:
+            action = self.actions.get(admission_type)
+            if action:
+                action["verified"] = action.get("verified", 0) + 1
+
+    def forget(self, admission_type):
+        with self._lock:
+            self.actions.pop(admission_type, None)
+
+    def learn(self, row, calls, route=None, session=None, photo=None):
+        """Learn from the calls the browser made while a row succeeded.
+
+        The last successful call with a JSON body becomes the action for the
+        row's Admission Type; it counts as a confirmation when it matches what
+        was already learned and replaces it otherwise. Successful calls with
+        any other body (file uploads) are noted, as the engine cannot replay them.
+        """
+        gr_no = row["GR NO"]
+        student_id = student_id_from_route(route)
+        saved = [c for c in calls if c["method"] in MUTATING_METHODS and c["status"] and 200 <= c["status"] < 300]
+        mutations = [c for c in saved if isinstance(c["body"], dict)]
+        with self._lock:
+            if mutations:
+                call = mutations[-1]
+                action = {
+                    "method": call["method"],
+                    "url": _url_template(call["url"], gr_no, student_id),
+                    "body": _body_template(call["body"], row, photo=photo),
+                    "uploads": len(saved) - len(mutations),
+                }
+                known = self.actions.get(row["Admission Type"])
+                if known and {k: known[k] for k in action} == action:
+                    known["confirmations"] += 1
+                else:
+                    known = self.actions[row["Admission Type"]] = {**action, "confirmations": 1}
+                if _constants(action["body"]):
+                    self._witness(known, row)
+                if self.auth is None and session is not None:
+                    self.auth = self._learn_auth(call["headers"], session)
+
+            if self.lookup is None and student_id is not None:
+                for call in calls:
+                    if call["method"] != "GET" or call["status"] != 200 or str(gr_no) not in call["url"]:
+                        continue
+                    keys = _find_record(call["response"], gr_no, student_id)
+                    if keys:
+                        url = _url_template(call["url"], gr_no)
+                        self.lookup = {"url": url, "gr_key": keys[0], "id_key": keys[1]}
+                        break
+
+    def _learn_auth(self, headers, session):
+        for store, key, value in _storage_items(session):
+            if len(value) < MIN_TOKEN_LENGTH:
+                continue
+            for name, header in headers.items():
+                if name.lower() != "cookie" and value in header:
+                    return {"header": name, "store": store, "key": key, "prefix": header[:header.index(value)]}
+        # Cookies alone authenticate this portal.
+        return {}
+
+    def auth_headers(self, session):
+        if not self.auth:
+            return {}
+        for store, key, value in _storage_items(session):
+            if (store, key) == (self.auth["store"], self.auth["key"]):
+                return {self.auth["header"]: self.auth["prefix"] + value}
+        return {}
+
+
+class RateLimiter:
+    """Spaces calls at least 1/per_second apart, shared by every task."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ApiEngine:
+    """Sends rows straight to the portal's backend with the calls of an ApiProfile.
+
+    One pooled Playwright request context (no browser) carries the cookies of
+    the signed-in session. Up to `workers` GR NOs are in flight at once, all
+    calls share one rate limit, and the rows of a GR NO go out in order.
+    """
+
+    def __init__(self, base_url: str, profile: ApiProfile, session, workers=1, rate=DEFAULT_RATE, gr_index=None, photo_for=None):
+        self.base_url = base_url
+        self.profile = profile
+        self.session = session
+        self.workers = max(1, workers)
+        self.rate = rate
+        self.gr_index = gr_index
+        self.photo_for = photo_for or (lambda gr_no: None)
+        self._session_lost = False
+
+    def run(self, rows):
+        """Submit rows; returns {row index: None when done, else why the browser should do it}."""
+        return asyncio.run(self._run(rows))
+
+    async def _run(self, rows):
+        results = {}
+        limiter = RateLimiter(self.rate)
+        slots = asyncio.Semaphore(self.workers)
+        async with async_playwright() as p:
+            request = await p.request.new_context(
+                base_url=self.base_url,
+                storage_state=self.session["storage_state"],
+                extra_http_headers=self.profile.auth_headers(self.session),
+            )
+            try:
+                groups = rows.groupby(rows["GR NO"].astype(str), sort=False)
+                await asyncio.gather(*(
+                    self._submit_student(request, limiter, slots, student_rows, results)
+                    for _, student_rows in groups
+                ))
+            finally:
+                await request.dispose()
+        return results
+
+    async def _submit_student(self, request, limiter, slots, student_rows, results):
+        async with slots:
+            error = None
+            for index, row in student_rows.iterrows():
+                if error is None and self._session_lost:
+                    error = "session expired"
+                if error is not None:
+                    # A later row of the GR NO must not overtake the one left to the browser.
+                    results[index] = error
+                    continue
+                try:
+                    await self._submit_row(request, limiter, row.to_dict())
+                    results[index] = None
+                except SessionLost:
+                    self._session_lost = True
+                    error = results[index] = "session expired"
+                except Exception as e:
+                    error = results[index] = str(e)
+
+    async def _call(self, request, limiter, method, url, body=None):
+        await limiter.wait()
+        response = await request.fetch(url, method=method, data=body)
+        if response.status == 401:
+            raise SessionLost()
+        if not response.ok:
+            raise RuntimeError(f"{method} {url} answered {response.status}: {(await response.text())[:200]}")
+        return response
+
+    async def _student_id(self, request, limiter, gr_no):
+        route = self.gr_index.get(gr_no) if self.gr_index is not None else None
+        if route:
+            return student_id_from_route(route)
+        lookup = self.profile.lookup
+        response = await self._call(request, limiter, "GET", _render_url(lookup["url"], gr_no))
+        student_id = _find_student_id(await response.json(), gr_no, lookup["gr_key"], lookup["id_key"])
+        if student_id is None:
+            raise LookupError(f"GR NO {gr_no} not found")
+        return student_id
+
+    async def _submit_row(self, request, limiter, row):
+        action = self.profile.actions[row["Admission Type"]]
+        student_id = None
+        if "{student_id}" in action["url"]:
+            student_id = await self._student_id(request, limiter, row["GR NO"])
+        body = _render_body(action["body"], row, self.photo_for(row["GR NO"]))
+        await self._call(request, limiter, action["method"], _render_url(action["url"], row["GR NO"], student_id), body)
+
+
+def main():
+    """Record the add-student call from a manual entry in a visible browser."""
+    import bot
+    from playwright.sync_api import sync_playwright
+    from preflight import read_workbook, prepare
+
+    parser = argparse.ArgumentParser(description="Teach the API engine a call by entering one sheet row by hand.")
+    parser.add_argument("sheet", help="the .xlsx the row comes from")
+    parser.add_argument("row", type=int, help="Excel row number of the row you will enter")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    args = parser.parse_args()
+
+    with open(args.sheet, "rb") as f:
+        _, data = read_workbook(f.read())
+    plan, _ = prepare(data)
+    row = plan.loc[args.row].to_dict()
+    profile = ApiProfile(bot.EMIS_URL)
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=False)
+        context, page = bot.open_session(browser, args.username, args.password)
+        session = bot.capture_session(context, page)
+        recorder = CallRecorder(context)
+        print(f"Enter and submit GR NO {row['GR NO']} ({row['Admission Type']}) in the browser, then close it.")
+        page.wait_for_event("close", timeout=0)
+        bot.photo_store.build_index()
+        profile.learn(row, recorder.take(), session=session, photo=bot.photo_store.path_for(row["GR NO"]))
+        browser.close()
+    profile.save()
+    learned = [
+        f"{kind} ({a['confirmations']}/{CONFIRMATIONS} recordings"
+        + (", not replayable: it uploads a file" if a.get("uploads") or _has_photo(a["body"]) else "") + ")"
+        for kind, a in profile.actions.items()
+    ]
+    print(f"Learned: {', '.join(learned) or 'nothing'} (saved to {profile.path})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,84 @@
 import streamlit as st
 import pandas as pd
-from bot import fill_form_from_excel
+from bot import start_fill_form
+from journal import run_id_for, journal_summary, reset_journal, RESUME, FAILED, INTERRUPTED
+from progress import ProgressTracker
+from preflight import prepare, read_workbook
+from photos import PhotoStore
+from perf import build_report
+import hashlib
 import io
-import os
+import threading
 
-template = pd.read_excel("data/template.xlsx")
+TEMPLATE_PATH = "data/template.xlsx"
+
+
+@st.cache_resource
+def load_template():
+    """Read the template and build its download bytes once per server process."""
+    template = pd.read_excel(TEMPLATE_PATH)
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        template.to_excel(writer, index=False)
+    return template, output.getvalue()
+
+
+@st.cache_data(max_entries=4, show_spinner="Reading workbook...")
+def load_upload(digest: str, _content: bytes):
+    """Parse and pre-check an uploaded workbook, cached by its content hash.
+
+    Streamlit re-runs this script on every widget change; only a new file
+    (a new digest) is parsed again.
+    """
+    header, data = read_workbook(_content)
+    if header != load_template()[0].columns.tolist():
+        return data, None, None, None
+    plan, rejected = prepare(data)
+    return data, plan, rejected, run_id_for(data)
+
+
+template, excel_data = load_template()
 
 st.title("EMIS Form Filler")
 
-output = io.BytesIO()
-with pd.ExcelWriter(output, engine='openpyxl') as writer:
-    template.to_excel(writer, index=False)
-excel_data = output.getvalue()
+
+@st.fragment(run_every=1)
+def show_progress():
+    """Poll the running batch and redraw its progress without re-running the page."""
+    run = st.session_state.get("run")
+    if run is None:
+        return
+    process, events, tracker = run["process"], run["events"], run["tracker"]
+    tracker.drain(events)
+    if not process.is_alive() and not tracker.finished:
+        tracker.drain(events)
+        if not tracker.finished:
+            tracker.finished = True
+            tracker.step = "Finished" if process.exitcode == 0 else f"Stopped unexpectedly (exit code {process.exitcode})"
+
+    if tracker.pending:
+        st.progress(min(tracker.processed / tracker.pending, 1.0), text=f"{tracker.processed} of {tracker.pending} row(s)")
+    done_col, failed_col, rate_col, eta_col = st.columns(4)
+    done_col.metric("Done", tracker.done)
+    failed_col.metric("Failed", tracker.failed)
+    rate_col.metric("Rows / min", f"{tracker.rows_per_minute:.1f}")
+    eta = tracker.eta_seconds
+    eta_col.metric("ETA", "-" if eta is None or tracker.finished else f"{eta / 60:.0f} min")
+    current = f" (GR NO {tracker.current_gr})" if tracker.current_gr is not None and not tracker.finished else ""
+    st.caption(f"Current step: {tracker.step}{current}")
+    if tracker.errors:
+        with st.expander(f"Failed rows ({len(tracker.errors)})"):
+            st.text("\n".join(tracker.errors))
+    if tracker.finished:
+        st.success("Form filling process completed.")
+        report = build_report(run["run_id"])
+        if not report.empty or tracker.reports:
+            with st.expander("Performance report (ms per step)"):
+                for line in tracker.reports:
+                    st.caption(line)
+                if not report.empty:
+                    st.dataframe(report, hide_index=True)
+
 
 st.download_button(
     label="Download template",
@@ -24,11 +91,14 @@ st.download_button(
 uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
 
 if uploaded_file is not None:
-    data = pd.read_excel(uploaded_file)
+    content = uploaded_file.getvalue()
+    data, plan, rejected, run_id = load_upload(hashlib.sha256(content).hexdigest(), content)
     st.write(data)
-    if data.columns.tolist() == template.columns.tolist():
-        st.error("Columns in the Excel file do not match the template.", icon="🚨")
-    
+    if plan is not None:
+        if not rejected.empty:
+            st.warning(f"{len(rejected)} row(s) will be skipped because they would fail in the portal:")
+            st.dataframe(rejected, hide_index=True)
+
         username = st.text_input("Username")
         password = st.text_input("Password", type="password")
 
@@ -38,19 +108,60 @@ if uploaded_file is not None:
             )
 
             if photos:
-                save_dir = "Photos"
-                os.makedirs(save_dir, exist_ok=True)
-                for photo in photos:
-                    save_path = os.path.join(save_dir, photo.name)
-                    with open(save_path, "wb") as f:
-                        f.write(photo.getbuffer())
-                st.success(f"Saved {len(photos)} file(s) to: {save_dir}")
-
-                if st.button("Run"):
+                store = PhotoStore()
+                batch = tuple(sorted(photo.file_id for photo in photos))
+                if st.session_state.get("photo_batch") != batch:
+                    saved, unchanged = store.save_uploads(photos)
+                    st.session_state["photo_batch"] = batch
+                    st.session_state["photo_saved"] = (saved, unchanged)
+                    # Shrink oversized phone photos while the operator finishes the form.
+                    threading.Thread(target=store.optimize, daemon=True).start()
+                else:
+                    store.build_index()
+                saved, unchanged = st.session_state["photo_saved"]
+                st.success(f"Saved {saved} new photo(s) to: {store.photo_dir} ({unchanged} unchanged)")
+
+                missing = store.missing(plan.loc[plan["Admission Type"] == "New Admission", "GR NO"])
+                if missing:
+                    st.warning(f"{len(missing)} new admission(s) have no photo and will be skipped: {', '.join(missing)}")
+
+                workers = st.number_input("Parallel workers", min_value=1, max_value=8, value=1, step=1)
+                lean = st.checkbox("Lean mode (hidden browser, skip images and fonts)", help="Uses less bandwidth and memory; you will not see the browser.")
+                trace_slowest = st.number_input(
+                    "Keep browser traces of the slowest rows", min_value=0, max_value=20, value=0, step=1,
+                    help="Saved under runs/ for viewing with `playwright show-trace`; 0 disables tracing.",
+                )
+                api = st.checkbox(
+                    "Send rows through the portal's API when possible",
+                    help="Rows the bot has already seen the portal save twice are sent without the browser; "
+                         "the browser handles the rest, checks a few API rows and keeps learning.",
+                )
+
+                summary = journal_summary(run_id)
+                run_mode = "Resume"
+                if summary["done"] or summary["failed"] or summary["started"]:
+                    st.info(
+                        f"This sheet was run before: {summary['done']} row(s) done, "
+                        f"{summary['failed']} failed, {summary['started']} interrupted."
+                    )
+                    modes = ["Resume", "Retry failed rows only", "Retry interrupted rows", "Start over"]
+                    run_mode = st.radio(
+                        "Run mode", modes, horizontal=True,
+                        help="Resume leaves interrupted rows out: they may already be in the portal. "
+                             "Check their status history first, then retry them on their own.",
+                    )
+
+                run = st.session_state.get("run")
+                running = run is not None and run["process"].is_alive()
+                if st.button("Run", disabled=running):
                     try:
-                        fill_form_from_excel(data, username, password)
-                        st.success("Form filling process completed successfully!")
+                        if run_mode == "Start over":
+                            reset_journal(run_id)
+                        process, events = start_fill_form(plan, username, password, int(workers), run_id, {"Retry failed rows only": FAILED, "Retry interrupted rows": INTERRUPTED}.get(run_mode, RESUME), lean, int(trace_slowest), api)
+                        st.session_state["run"] = {"process": process, "events": events, "tracker": ProgressTracker(), "run_id": run_id}
                     except Exception as e:
                         st.error(f"An error occurred {e}")
+
+                show_progress()
     else:
         st.error("Columns in the Excel file do not match the template.", icon="🚨")
\ No newline at end of file
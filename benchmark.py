@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import date, timedelta
+
+from openpyxl import Workbook
+from PIL import Image
+
+import bot
+import perf
+from gr_index import GrIndex
+from journal import RUNS_DIR, journal_summary, read_states, row_key
+from mock_portal import MockPortal, VOCABULARY, STATUSES
+from photos import PhotoStore
+from preflight import PLAN_COLUMNS, read_workbook
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+BENCH_USER = "bench"
+SIZES = (100, 1000, 10000)
+
+# A run regresses when it is this much slower (or bigger) than the baseline.
+TOLERANCE = 0.2
+
+
+def generate_rows(count: int, new_share=0.5, seed=0):
+    """Sheet rows with values every mock dropdown accepts, about new_share of them New Admissions."""
+    rng = random.Random(seed)
+    pick = lambda field: rng.choice(VOCABULARY[field])
+    digits = lambda n: str(rng.randint(10 ** (n - 1), 10 ** n - 1))
+    rows = []
+    for i in range(count):
+        admission_type = "New Admission" if rng.random() < new_share else rng.choice(STATUSES)
+        birth = date(2010, 1, 1) + timedelta(days=rng.randint(0, 3650))
+        rows.append({
+            "Admission Type": admission_type,
+            "Admission Date": date(2025, 4, 1) + timedelta(days=rng.randint(0, 60)),
+            "GR NO": str(100000 + i),
+            "Class Admitted": pick("Class Admitted"),
+            "Current Class": pick("Current Class"),
+            "Select Section": pick("Select Section"),
+            "Medium": pick("Medium"),
+            "Shift": pick("Shift"),
+            "Students Name": f"Student {i}",
+            "Student Surname": "Khan",
+            "B-FORM": digits(13),
+            "Date Of Birth": birth,
+            "Gender": pick("Gender"),
+            "Religion": pick("Religion"),
+            "Disability": "NO",
+            "Blood Group": pick("Blood Group"),
+            "Mother Tongue": pick("Mother Tongue"),
+            "Emergency Contact Name": f"Guardian {i}",
+            "Emergency Contact Number": digits(10),
+            "Region": pick("Region"),
+            "District": pick("District"),
+            "Taluka": pick("Taluka"),
+            "Union Coucil": pick("Union Coucil"),
+            "Cily/Village/Area": "Gulshan",
+            "Address": f"House {i}, Street {i % 50}",
+            "Salutaion": "Mr",
+            "Name": f"Father {i}",
+            "Surname": "Khan",
+            "CNIC": digits(13),
+            "Mobile No": digits(10),
+            "Occupation": "Labour",
+            "Qualification": pick("Qualification"),
+        })
+    return rows
+
+
+def write_workbook(rows, path: str):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(PLAN_COLUMNS)
+    for row in rows:
+        sheet.append([row[c] for c in PLAN_COLUMNS])
+    workbook.save(path)
+
+
+def write_photos(gr_nos, photo_dir: str):
+    """A small JPEG per GR NO, enough for the upload step."""
+    os.makedirs(photo_dir, exist_ok=True)
+    sample = os.path.join(photo_dir, ".sample.jpg")
+    Image.new("RGB", (120, 160), (200, 200, 200)).save(sample, "JPEG")
+    with open(sample, "rb") as f:
+        content = f.read()
+    for gr_no in gr_nos:
+        with open(os.path.join(photo_dir, f"{gr_no}.jpg"), "wb") as f:
+            f.write(content)
+
+
+def _process_tree_rss(root_pid: int):
+    """Resident memory (bytes) of a process and all its descendants, read from /proc."""
+    parents = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                # The command name may contain spaces; fields resume after ')'.
+                parents[int(name)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree, frontier = {root_pid}, [root_pid]
+    while frontier:
+        pid = frontier.pop()
+        children = [child for child, parent in parents.items() if parent == pid]
+        tree.update(children)
+        frontier.extend(children)
+    total = 0
+    for pid in tree:
+        try:
+            with open(f"/proc/{pid}/statm", "r") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class RssSampler:
+    """Tracks the peak resident memory of the bot, its Playwright driver and Chromium."""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        if os.path.isdir("/proc"):
+            self.peak = max(self.peak, _process_tree_rss(os.getpid()))
+        else:
+            import resource
+            # Only this process on systems without /proc; ru_maxrss is KiB on Linux, bytes on macOS.
+            self.peak = max(self.peak, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return self.peak
+
+
+def unconfirmed_rows(run_id: str, portal: MockPortal):
+    """Status rows the journal marks done that the mock portal never stored.
+
+    New Admissions are not counted: the bot does not submit the add-student
+    form, so the portal has nothing to check them against.
+    """
+    stored = {row_key(gr_no, status) for gr_no, status in portal.stored_statuses()}
+    return sum(
+        1 for key, entry in read_states(run_id).items()
+        if entry["status"] == "done" and not key.endswith("|New Admission") and key not in stored
+    )
+
+
+def run_benchmark(rows: int, workers=1, lean=True, latency=0.05, jitter=0.5, failure_rate=0.0, seed=0, api=False):
+    """Run _fill_form_sync on a generated sheet against a fresh mock portal.
+
+    Returns rows per minute (rows done per wall-clock minute, leaving out
+    status rows the portal did not store), peak RSS of the whole browser tree
+    and the run's step timings.
+    """
+    work_dir = os.path.join(BENCH_DIR, f"{rows}-rows")
+    sheet_path = os.path.join(work_dir, "sheet.xlsx")
+    os.makedirs(work_dir, exist_ok=True)
+    generated = generate_rows(rows, seed=seed)
+    write_workbook(generated, sheet_path)
+    write_photos([r["GR NO"] for r in generated if r["Admission Type"] == "New Admission"], os.path.join(work_dir, "Photos"))
+    with open(sheet_path, "rb") as f:
+        _, data = read_workbook(f.read())
+
+    portal = MockPortal(latency=latency, jitter=jitter, failure_rate=failure_rate, seed=seed)
+    portal.seed_students(r["GR NO"] for r in generated if r["Admission Type"] != "New Admission")
+    bot.EMIS_URL = portal.start()
+    bot.photo_store = PhotoStore(os.path.join(work_dir, "Photos"))
+    # Student routes of an earlier mock portal lead to other students.
+    try:
+        os.remove(GrIndex(BENCH_USER).path)
+    except FileNotFoundError:
+        pass
+
+    run_id = f"bench-{rows}-{time.strftime('%Y%m%d-%H%M%S')}"
+    sampler = RssSampler()
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        bot._fill_form_sync(data, BENCH_USER, BENCH_USER, workers=workers, run_id=run_id, lean=lean, api=api)
+    finally:
+        seconds = time.perf_counter() - started
+        peak_rss = sampler.stop()
+        portal.stop()
+
+    summary = journal_summary(run_id)
+    unconfirmed = unconfirmed_rows(run_id, portal)
+    done = summary["done"] - unconfirmed
+    report = perf.build_report(run_id)
+    steps = report[report["admission_type"] == "All"].drop(columns="admission_type") if not report.empty else report
+    return {
+        "rows": rows,
+        "workers": workers,
+        "lean": lean,
+        "api": api,
+        "latency": latency,
+        "failure_rate": failure_rate,
+        "run_id": run_id,
+        "seconds": round(seconds, 1),
+        "done": done,
+        "failed": summary["failed"],
+        "unconfirmed": unconfirmed,
+        "rows_per_minute": round(done / seconds * 60, 2) if seconds else 0.0,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+        "steps": steps.to_dict("records"),
+    }
+
+
+def find_regressions(result: dict, baseline: dict, tolerance=TOLERANCE):
+    """Messages for every figure of result that is worse than baseline beyond tolerance."""
+    problems = []
+    if result["rows_per_minute"] < baseline["rows_per_minute"] * (1 - tolerance):
+        problems.append(f"{result['rows']} rows: {result['rows_per_minute']} rows/min, baseline {baseline['rows_per_minute']}")
+    if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        problems.append(f"{result['rows']} rows: peak RSS {result['peak_rss_mb']} MiB, baseline {baseline['peak_rss_mb']}")
+    old_p95 = {s["step"]: s["p95"] for s in baseline.get("steps", [])}
+    for step in result["steps"]:
+        if step["step"] in old_p95 and step["p95"] > old_p95[step["step"]] * (1 + tolerance):
+            problems.append(f"{result['rows']} rows: {step['step']} p95 {step['p95']:.0f} ms, baseline {old_p95[step['step']]:.0f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot against the local mock EMIS portal.")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(SIZES), help="sheet sizes to run")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--headed", action="store_true", help="run without lean mode, with a visible browser")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every portal API call")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--api", action="store_true", help="send learned rows through the API engine")
+    parser.add_argument("--baseline", help="results JSON to compare against; exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        result = run_benchmark(rows, args.workers, not args.headed, args.latency, args.jitter, args.failure_rate, api=args.api)
+        print(f"{rows} rows: {result['rows_per_minute']} rows/min, {result['failed']} failed, peak RSS {result['peak_rss_mb']} MiB")
+        if result["unconfirmed"]:
+            print(f"{rows} rows: {result['unconfirmed']} row(s) marked done were not stored by the portal")
+        results.append(result)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}; step timings in {RUNS_DIR}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {r["rows"]: r for r in json.load(f)}
+        problems = [p for r in results if r["rows"] in baseline for p in find_regressions(r, baseline[r["rows"]], args.tolerance)]
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
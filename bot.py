@@ -1,10 +1,23 @@
 import os
 import re
 import time
+import socket
+import threading
 import pandas as pd
-from playwright.sync_api import sync_playwright, Page, expect
+from playwright.sync_api import sync_playwright, Page, expect, TimeoutError as PlaywrightTimeoutError
 import logging
+import json
+import hashlib
+from urllib.parse import urlparse
 import multiprocessing
+from gr_index import GrIndex
+from journal import Journal, run_id_for, RESUME
+from progress import emit, set_event_queue
+from preflight import prepare, ADMISSION_TYPES
+from photos import PhotoStore
+import perf
+from session_store import load_session, save_session, clear_session
+from api_engine import ApiEngine, ApiProfile, CallRecorder
 
 # --- Logging Setup ---
 logging.basicConfig(
@@ -15,6 +28,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Override with the EMIS_URL environment variable to run against mock_portal.py.
+EMIS_URL = os.environ.get("EMIS_URL", "https://emis.sef.edu.pk/")
+
 ERROR_CODES = {
     'LOGIN_FAILED': 'E001',
     'NAVIGATION_FAILED': 'E002',
@@ -36,7 +52,10 @@ ERROR_CODES = {
     'TTS_ERROR': 'E017',
     'BROWSER_ERROR': 'E018',
     'DATA_PARSE_ERROR': 'E019',
-    'RELOAD_ERROR': 'E020'
+    'RELOAD_ERROR': 'E020',
+    'SESSION_ERROR': 'E021',
+    'API_ERROR': 'E022',
+    'RECOVERY_ERROR': 'E023'
 }
 
 def log_error(logger, error_code, message, gr_no=None):
@@ -47,6 +66,148 @@ def log_error(logger, error_code, message, gr_no=None):
     logger.error(error_msg)
     return error_msg
 
+# --- Wait Helpers ---
+# Ceilings (ms) for waits on real page signals. A wait returns as soon as its
+# signal fires; the ceiling only bounds how long a slow portal can stall a row.
+WAIT_TIMEOUTS = {
+    'angular': 2500,
+    'element': 20000,
+    'login': 30000,
+    'overlay': 5000,
+    'table': 15000,
+}
+
+ANGULAR_STABLE_JS = """() => {
+    const getter = window.getAllAngularTestabilities;
+    if (!getter) return document.readyState === 'complete';
+    const testabilities = getter();
+    return testabilities.length === 0 || testabilities.every(t => t.isStable());
+}"""
+
+def _timed_wait(name, wait, strict=True):
+    """Run a wait, record how long it took as a wait.<name> span and re-raise on timeout if strict."""
+    started = time.perf_counter()
+    try:
+        wait()
+    except PlaywrightTimeoutError:
+        if strict:
+            raise
+    finally:
+        perf.record(f"wait.{name}", (time.perf_counter() - started) * 1000)
+
+def wait_for_angular(page, timeout=None):
+    """Wait until Angular has no pending HTTP requests, timers or change detection."""
+    timeout = timeout or WAIT_TIMEOUTS['angular']
+    # Apps that poll in the background never settle, so the ceiling is short and
+    # soft: the element and response waits that follow are what must succeed.
+    _timed_wait('angular', lambda: page.wait_for_function(ANGULAR_STABLE_JS, timeout=timeout), strict=False)
+
+def wait_for_element(page, selector, state="visible", timeout=None, name='element'):
+    """Wait for an element to reach the given state."""
+    timeout = timeout or WAIT_TIMEOUTS['element']
+    _timed_wait(name, lambda: page.locator(selector).first.wait_for(state=state, timeout=timeout))
+
+def wait_for_overlay(page, state="hidden", timeout=None):
+    """Wait for the Material overlay backdrop (open mat-select, dialog) to appear or go away."""
+    timeout = timeout or WAIT_TIMEOUTS['overlay']
+    _timed_wait('overlay', lambda: page.locator(".cdk-overlay-backdrop").first.wait_for(state=state, timeout=timeout))
+
+def wait_for_table_refresh(page, gr_no, timeout=None):
+    """Wait until the student table shows the searched GR NO or reports no rows."""
+    timeout = timeout or WAIT_TIMEOUTS['table']
+    script = """(gr) => {
+        const cells = [...document.querySelectorAll('mat-cell.cdk-column-grNo')];
+        if (cells.some(c => c.textContent.trim() === gr)) return true;
+        return cells.length === 0 && !!document.querySelector('app-all-students');
+    }"""
+    _timed_wait('table', lambda: page.wait_for_function(script, arg=str(gr_no), timeout=timeout))
+
+# --- Lean Browser Profile ---
+ASSET_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "assets")
+
+# Requests the bot never needs: pictures and fonts only matter to a human
+# looking at the page, and analytics beacons only slow navigation down.
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "facebook.net", "hotjar.com", "clarity.ms",
+)
+
+# Fingerprinted static bundles (main.3f2a9c1d.js) never change under the same
+# name, so they are served from disk after the first download.
+CACHEABLE_ASSET = re.compile(r"[.-][0-9a-f]{8,}\.(js|css)$")
+
+class AssetRouter:
+    """Route handler for lean mode: blocks unneeded assets and caches static bundles.
+
+    One router is shared by every context of a run and counts what it saved.
+    """
+
+    def __init__(self, cache_dir=ASSET_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.blocked = 0
+        self.cache_hits = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def attach(self, context):
+        context.route("**/*", self.handle)
+
+    def _cache_path(self, url: str):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def _store(self, cache_path, body: bytes, content_type: str):
+        """Write a bundle to the cache; every worker thread writes through its own temp files."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        for path, data in ((f"{cache_path}.type", content_type.encode("utf-8")), (cache_path, body)):
+            with open(f"{path}.{suffix}", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.{suffix}", path)
+
+    def handle(self, route):
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOSTS):
+            with self._lock:
+                self.blocked += 1
+            route.abort()
+            return
+
+        path = urlparse(request.url).path
+        if request.method != "GET" or not CACHEABLE_ASSET.search(path):
+            route.continue_()
+            return
+
+        cache_path = self._cache_path(request.url)
+        try:
+            with open(cache_path, "rb") as f:
+                body = f.read()
+            with open(f"{cache_path}.type", "r", encoding="utf-8") as f:
+                content_type = f.read()
+        except OSError:
+            response = route.fetch()
+            body = response.body()
+            if response.ok:
+                try:
+                    self._store(cache_path, body, response.headers.get("content-type", "application/javascript"))
+                except OSError as e:
+                    # The bundle is still served; it is just downloaded again next time.
+                    log_error(logger, ERROR_CODES['BROWSER_ERROR'], f"Error caching {path}: {e}")
+            route.fulfill(response=response, body=body)
+            return
+
+        with self._lock:
+            self.cache_hits += 1
+            self.bytes_saved += len(body)
+        route.fulfill(status=200, body=body, content_type=content_type)
+
+    def report(self):
+        return (
+            f"Lean mode: blocked {self.blocked} request(s), served {self.cache_hits} bundle(s) "
+            f"from disk ({self.bytes_saved / 1024:.0f} KiB not downloaded)"
+        )
+
 # --- Helper Functions ---
 def select_mat_option_by_label(page: Page, label: str, value: str):
     # Find the mat-select combobox by its accessible label (e.g. "Items per page:")
@@ -69,21 +230,74 @@ def select_mat_option_by_label(page: Page, label: str, value: str):
     # Verify the combobox now shows the chosen value
     expect(combobox).to_have_text(value)
 
-def select_dropdown(page, element_id, value, error_code, field_name, gr_no, Type="ID"):
-    """Select an option from a dropdown by visible text."""
+# Photos of the current run, indexed by GR NO in _fill_form_sync.
+photo_store = PhotoStore()
+
+# Option labels seen in each dropdown during this run, keyed by field name and
+# the value of the field it depends on (e.g. District under a given Region).
+option_cache = {}
+
+PICK_OPTION_JS = """(value) => {
+    const options = [...document.querySelectorAll('.cdk-overlay-container mat-option')];
+    const labels = options.map(o => o.textContent.replace(/\\s+/g, ' ').trim());
+    const match = options[labels.indexOf(value)];
+    if (match) {
+        match.scrollIntoView({block: 'nearest'});
+        match.click();
+    }
+    return {found: !!match, labels: labels};
+}"""
+
+@perf.timed("select_dropdown")
+def select_dropdown(page, element_id, value, error_code, field_name, gr_no, Type="ID", parent=None):
+    """Select an option from a dropdown by visible text.
+
+    The open option list is searched and clicked in a single in-page call and
+    remembered for the run, so a value the dropdown does not offer fails
+    straight away instead of waiting out a Playwright timeout. parent is the
+    value of the field this dropdown's options depend on, if any; such a list
+    may still be loading when it opens, so it is read once Angular settles,
+    read again before a value counts as missing, and remembered only when the
+    value was found in it.
+
+    Type "ID" clicks the mat-select with that id, "FORM" the element_id-th
+    mat-select of the add-student form and "TEXT" the one labelled field_name.
+    """
+    value = str(value).strip()
+    cache_key = (field_name, parent)
     try:
+        known = option_cache.get(cache_key)
+        if known is not None and value not in known:
+            raise ValueError(f"'{value}' is not an option for {field_name} (options: {', '.join(known)})")
+
         if Type == "ID":
             page.click(f"id={element_id}")
-            page.click(f"xpath=//mat-option/span[normalize-space(text())='{value}']")
+        elif Type == "FORM":
+            page.locator("app-add-student mat-select").nth(element_id).click()
         elif Type == "TEXT":
             status_label = page.locator(f"xpath=//mat-label[contains(., '{field_name}')]")
             status_select = status_label.locator("xpath=ancestor::mat-form-field//mat-select")
             status_select.click()
-            page.click(f"xpath=//mat-option/span[normalize-space(text())='{value}']")
+        wait_for_element(page, ".cdk-overlay-container mat-option", timeout=WAIT_TIMEOUTS['overlay'], name='overlay')
+        if parent is not None:
+            wait_for_angular(page)
+
+        result = page.evaluate(PICK_OPTION_JS, value)
+        if not result["found"]:
+            # The options may have arrived after the first mat-option showed.
+            wait_for_angular(page)
+            result = page.evaluate(PICK_OPTION_JS, value)
+        if result["found"] or parent is None:
+            option_cache[cache_key] = result["labels"]
+        if not result["found"]:
+            page.keyboard.press("Escape")
+            raise ValueError(f"'{value}' is not an option for {field_name} (options: {', '.join(result['labels'])})")
+        wait_for_overlay(page, "hidden")
     except Exception as e:
         log_error(logger, error_code, f'Error in {field_name}: {e} by using Type {Type}', gr_no)
         raise
 
+@perf.timed("fill_input")
 def fill_input(page, xpath, value, error_code, field_name, gr_no, is_int=False):
     """Fill an input field if value is not NaN."""
     try:
@@ -94,22 +308,25 @@ def fill_input(page, xpath, value, error_code, field_name, gr_no, is_int=False):
         log_error(logger, error_code, f'Error in {field_name}: {e}', gr_no)
         raise
 
+@perf.timed("fill_date")
 def fill_date(page, xpath, value, error_code, field_name, gr_no):
     """Fill a date input field with formatted date."""
     try:
         if pd.notna(value):
-            formatted_date = pd.Timestamp(str(value)).strftime('%m/%d/%Y')
+            # Dates from the preflight plan are already MM/DD/YYYY strings.
+            formatted_date = value if isinstance(value, str) else pd.Timestamp(value).strftime('%m/%d/%Y')
             page.locator(xpath).fill(formatted_date)
     except Exception as e:
         log_error(logger, error_code, f'Error in {field_name}: {e}', gr_no)
         raise
 
+@perf.timed("upload_image")
 def upload_image(page, gr_no, error_code):
-    """Upload image if exists for the given GR NO."""
+    """Upload the photo indexed for the given GR NO."""
+    emit("step", step="Uploading photo", gr_no=gr_no)
     try:
-        image_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Photos")
-        image_path = os.path.join(image_dir, f"{gr_no}.jpg")
-        if os.path.exists(image_path):
+        image_path = photo_store.path_for(gr_no)
+        if image_path is not None:
             page.set_input_files(
                 "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[2]/div[1]/app-file-upload/div/input",
                 image_path
@@ -121,30 +338,88 @@ def upload_image(page, gr_no, error_code):
         log_error(logger, error_code, f'Error in Image: {e}', gr_no)
         raise
 
+@perf.timed("navigate_to")
 def navigate_to(page, option: str, error_code, gr_no):
     """Navigate to a specific section in the EMIS portal."""
+    emit("step", step=f"Opening {option}", gr_no=gr_no)
     try:
         page.click("xpath=//html/body/app-root/app-main-layout/app-sidebar/div/aside/div/ul/li[5]/a")
         if option == "Add Student":
             page.click("xpath=/html/body/app-root/app-main-layout/app-sidebar/div/aside/div/ul/li[5]/ul/li[2]/a")
-            page.wait_for_timeout(2000)
+            wait_for_element(page, "app-add-student", name='navigation')
+            wait_for_angular(page)
         elif option == "Student List":
             page.click("xpath=/html/body/app-root/app-main-layout/app-sidebar/div/aside/div/ul/li[5]/ul/li[1]/a")
-            page.wait_for_timeout(1000)
+            wait_for_element(page, "app-all-students", name='navigation')
+            wait_for_angular(page)
     except Exception as e:
         log_error(logger, error_code, f"Error in navigation: {e}", gr_no)
         raise
 
-def select_student_by_gr(page, gr_no, error_code):
-    """Select a student from the list by GR NO."""
+def current_route(page):
+    """Return the in-app route (path, query and hash) of the current page."""
+    return page.evaluate("() => location.pathname + location.search + location.hash")
+
+def open_route(page, route: str):
+    """Navigate the Angular router to a route without reloading the app."""
+    page.evaluate("""(route) => {
+        window.history.pushState({}, '', route);
+        window.dispatchEvent(new PopStateEvent('popstate', {state: {}}));
+    }""", route)
+
+def wait_for_student_view(page, gr_no, timeout=None):
+    """Wait until the student detail view shows the given GR NO.
+
+    Angular reuses the view when only the student id in the route changes, so
+    the previous student stays on screen until the new one has loaded.
+    """
+    timeout = timeout or WAIT_TIMEOUTS['table']
+    script = """(gr) => {
+        const view = document.querySelector('app-about-student');
+        if (!view) return false;
+        // The GR NO on its own, not as part of a longer number.
+        const text = view.textContent;
+        for (let i = text.indexOf(gr); i !== -1; i = text.indexOf(gr, i + 1)) {
+            const before = text[i - 1] || ' ', after = text[i + gr.length] || ' ';
+            if (!/[0-9A-Za-z]/.test(before) && !/[0-9A-Za-z]/.test(after)) return true;
+        }
+        return false;
+    }"""
+    _timed_wait('navigation', lambda: page.wait_for_function(script, arg=str(gr_no), timeout=timeout))
+
+def _open_student_route(page, route: str, gr_no):
+    """Open a cached student route, returning False if it does not lead to this GR NO's student."""
+    try:
+        open_route(page, route)
+        wait_for_student_view(page, gr_no)
+        wait_for_angular(page)
+        return True
+    except Exception:
+        return False
+
+@perf.timed("select_student_by_gr")
+def select_student_by_gr(page, gr_no, error_code, gr_index=None):
+    """Select a student from the list by GR NO.
+
+    When a GrIndex is given, a known GR NO opens its detail route directly
+    and a searched one is recorded for the next lookup.
+    """
+    emit("step", step="Finding student", gr_no=gr_no)
     try:
-        # navigate to student list
-        navigate_to(page, "Student List", ERROR_CODES['NAVIGATION_FAILED'], gr_no)
-        select_mat_option_by_label(page, "Items per page:", "100")  # Show 100 entries
+        route = gr_index.get(gr_no) if gr_index is not None else None
+        if route:
+            if _open_student_route(page, route, gr_no):
+                return
+            gr_index.invalidate(gr_no)
+
+        # navigate to student list, unless the previous row left it open
+        if page.locator("app-all-students").count() == 0:
+            navigate_to(page, "Student List", ERROR_CODES['NAVIGATION_FAILED'], gr_no)
+        if page.get_by_role("combobox", name="Items per page:").inner_text().strip() != "100":
+            select_mat_option_by_label(page, "Items per page:", "100")  # Show 100 entries
         fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-all-students/section/div/div[2]/div/div/div/div/div/div/div[1]/div/div[1]/ul/li[2]/input", gr_no, ERROR_CODES['INPUT_ERROR'], "Search", gr_no)
-        page.wait_for_timeout(100)
         page.click("xpath=/html/body/app-root/app-main-layout/div/app-all-students/section/div/div[2]/div/div/div/div/div/div/div[1]/div/div[1]/ul/li[3]/div/button")
-        page.wait_for_timeout(1000)
+        wait_for_table_refresh(page, gr_no)
         # Build exact regex pattern
         pattern = re.compile(rf"^\s*{str(gr_no)}\s*$")
 
@@ -153,196 +428,837 @@ def select_student_by_gr(page, gr_no, error_code):
 
         student = gr_cell.locator("xpath=ancestor::mat-row")
         student.locator("button[mat-icon-button]").nth(0).click()
+
+        if gr_index is not None:
+            wait_for_element(page, "app-about-student", name='navigation')
+            gr_index.add(gr_no, current_route(page))
     except Exception as e:
         log_error(logger, error_code, f"Error selecting student with GR NO {gr_no}: {e}", gr_no)
         raise
 
+@perf.timed("Go_to_edit_Status")
 def Go_to_edit_Status(page, error_code, gr_no):
     """Navigate to the Status tab of the selected student."""
+    emit("step", step="Changing status", gr_no=gr_no)
     try:
         page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/mat-tab-header/div/div/div/div[3]/div")
-        page.wait_for_timeout(1000)
+        wait_for_angular(page)
 
         # Click 'Change Status' button
         page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div/div[1]/div[2]/div/button")
-        page.wait_for_timeout(1000)
+        wait_for_element(page, "xpath=//mat-label[contains(., 'Status')]/ancestor::mat-form-field//mat-select", name='status_form')
     except Exception as e:
         log_error(logger, error_code, f"Error navigating to Status tab: {e}", gr_no)
         raise
 
-def _fill_form_sync(data, Username: str, Password: str):
-    ver = None
-    data.columns = data.columns.str.strip()
+SAVE_METHODS = ("POST", "PUT", "PATCH")
+
+@perf.timed("save_status")
+def save_status(page, error_code, gr_no):
+    """Click 'Add Status' and wait for the portal to store it; raises when it does not."""
+    try:
+        with page.expect_response(
+            lambda r: r.request.method in SAVE_METHODS and r.request.resource_type in ("xhr", "fetch"),
+            timeout=WAIT_TIMEOUTS['element'],
+        ) as saved:
+            page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div/div[2]/div/form/div/div/div/div[2]/div[2]/div/button[1]")
+        if not saved.value.ok:
+            raise RuntimeError(f"the portal answered {saved.value.status}")
+        wait_for_angular(page)
+    except Exception as e:
+        log_error(logger, error_code, f"Error saving status: {e}", gr_no)
+        raise
+
+def status_history(page):
+    """Open the Status tab of the selected student and return the text of its status history."""
+    page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/mat-tab-header/div/div/div/div[3]/div")
+    wait_for_angular(page)
+    history = page.locator("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div/div[1]")
+    history.wait_for(state="visible", timeout=WAIT_TIMEOUTS['element'])
+    return history.inner_text()
+
+def login(page, Username: str, Password: str):
+    """Sign in to the EMIS portal on the given page."""
+    try:
+        page.goto(EMIS_URL)
+        wait_for_element(page, "app-signin input", name='login')
+        page.fill("xpath=/html/body/app-root/app-auth-layout/app-signin/div/div/div[2]/div/div/form/div[1]/div/mat-form-field/div/div[1]/div[3]/input", Username)
+        page.fill("xpath=/html/body/app-root/app-auth-layout/app-signin/div/div/div[2]/div/div/form/div[2]/div/mat-form-field/div/div[1]/div[3]/input", Password)
+        page.click("xpath=/html/body/app-root/app-auth-layout/app-signin/div/div/div[2]/div/div/form/div[3]/div/button")
+        wait_for_element(page, "app-main-layout", timeout=WAIT_TIMEOUTS['login'], name='login')
+        wait_for_angular(page)
+    except Exception as e:
+        log_error(logger, ERROR_CODES['LOGIN_FAILED'], f"Error in login: {e}")
+        raise
+
+RESTORE_SESSION_STORAGE_JS = """(saved) => {
+    if (location.origin !== saved.origin) return;
+    for (const [key, value] of Object.entries(saved.items)) {
+        if (sessionStorage.getItem(key) === null) sessionStorage.setItem(key, value);
+    }
+}"""
+
+def is_logged_in(page):
+    """Open the portal and report whether the context is still signed in."""
+    page.goto(EMIS_URL)
+    wait_for_element(page, "app-main-layout, app-signin", name='login')
+    return page.locator("app-main-layout").count() > 0
+
+def capture_session(context, page):
+    """Snapshot cookies, localStorage and sessionStorage of a logged-in context."""
+    session_storage = page.evaluate("() => ({origin: location.origin, items: {...sessionStorage}})")
+    return {"storage_state": context.storage_state(), "session_storage": session_storage}
+
+def open_session(browser, Username: str, Password: str, session=None, router=None):
+    """Return a (context, page) pair that is signed in to the portal.
+
+    The given session, or the one cached for Username, is tried first. Only
+    when the portal sends it back to the sign-in page does this type the
+    credentials again, and a fresh login replaces the cached session. A
+    lean-mode AssetRouter, if given, is attached to the new context.
+    """
+    emit("step", step="Signing in")
+    session = session or load_session(Username, Password)
+    if session:
+        context = browser.new_context(storage_state=session["storage_state"])
+        if router is not None:
+            router.attach(context)
+        context.add_init_script(f"({RESTORE_SESSION_STORAGE_JS})({json.dumps(session['session_storage'])})")
+        page = context.new_page()
+        try:
+            if is_logged_in(page):
+                wait_for_angular(page)
+                return context, page
+        except Exception as e:
+            log_error(logger, ERROR_CODES['SESSION_ERROR'], f"Error checking cached session: {e}")
+        context.close()
+        clear_session(Username)
+
+    context = browser.new_context()
+    if router is not None:
+        router.attach(context)
+    page = context.new_page()
+    try:
+        login(page, Username, Password)
+    except Exception:
+        context.close()
+        raise
+    try:
+        save_session(Username, Password, capture_session(context, page))
+    except Exception as e:
+        log_error(logger, ERROR_CODES['SESSION_ERROR'], f"Error saving session: {e}")
+    return context, page
+
+PAGE_HEALTH_JS = """() => ({
+    layout: !!document.querySelector('app-main-layout'),
+    overlay: !!document.querySelector('.cdk-overlay-backdrop'),
+    signin: !!document.querySelector('app-signin'),
+})"""
+
+class SignedOut(Exception):
+    """The portal is showing its sign-in page: the session was lost."""
+
+def page_state(page):
+    """Which of the main layout, an open overlay and the sign-in page the page shows."""
+    try:
+        return page.evaluate(PAGE_HEALTH_JS)
+    except Exception:
+        return {"layout": False, "overlay": False, "signin": False}
+
+def page_is_healthy(page):
+    """True when the page shows the signed-in app with no overlay left open."""
+    state = page_state(page)
+    return state["layout"] and not state["overlay"]
+
+def ensure_healthy_page(page, gr_no=None):
+    """Reload the portal, but only when the page is not in a usable state.
+
+    Raises SignedOut straight away on the sign-in page, where a reload would
+    not help.
+    """
+    state = page_state(page)
+    if state["signin"]:
+        raise SignedOut("the portal signed the browser out")
+    if state["layout"] and not state["overlay"]:
+        return
+    emit("step", step="Reloading portal", gr_no=gr_no)
+    try:
+        with perf.span("reload"):
+            page.reload()
+            wait_for_element(page, "app-main-layout", name='reload')
+            wait_for_angular(page)
+    except Exception as e:
+        log_error(logger, ERROR_CODES['RELOAD_ERROR'], f"Error reloading page: {e}", gr_no)
+        raise
+
+# --- Recovery ---
+# Failures that may pass on their own and are worth another try at the end of
+# the run. "data" failures (a value the portal does not offer, a missing
+# photo) would only fail again.
+RETRYABLE_FAILURES = ("transient", "session", "closed")
+DATA_ERRORS = (ValueError, KeyError, TypeError, FileNotFoundError)
+RETRY_ROUNDS = 1
+
+class BrowserLost(Exception):
+    """The page is gone and no new one could be opened in its context."""
+
+def _close_overlays(page, attempts=3):
+    """Dismiss open mat-selects and dialogs with Escape; True when none is left."""
+    for _ in range(attempts):
+        if page.locator(".cdk-overlay-backdrop").count() == 0:
+            return True
+        page.keyboard.press("Escape")
+        try:
+            wait_for_overlay(page, "hidden")
+        except PlaywrightTimeoutError:
+            continue
+    return page.locator(".cdk-overlay-backdrop").count() == 0
+
+def _leave_to_dashboard(page):
+    """Open the dashboard in-app, which drops half-filled forms and open status editors."""
+    page.click("xpath=/html/body/app-root/app-main-layout/app-sidebar/div/aside/div/ul/li[3]/a", timeout=WAIT_TIMEOUTS['overlay'])
+    wait_for_element(page, "app-add-student, app-about-student, app-all-students", state="detached", name='navigation')
+    wait_for_angular(page)
+
+class Recovery:
+    """Puts a page back in a known-good state after a failed row.
+
+    The failure is classified first: "data" (the row itself is wrong),
+    "session" (the portal signed the browser out), "closed" (the page is
+    gone) or "transient" (timeouts and other portal hiccups). Restoring then
+    goes from cheap to expensive: close overlays, leave the current form for
+    the dashboard, sign in again only when signed out, and reload only when
+    the page is still unhealthy. One Recovery is shared by every worker of a
+    run and counts what it did.
+    """
+
+    def __init__(self, Username: str, Password: str):
+        self.username = Username
+        self.password = Password
+        self.failures = {}
+        self.relogins = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+
+    def classify(self, page, error):
+        if page.is_closed():
+            return "closed"
+        if isinstance(error, SignedOut) or page_state(page)["signin"]:
+            return "session"
+        if isinstance(error, DATA_ERRORS):
+            return "data"
+        return "transient"
+
+    def _count(self, name, kind=None):
+        with self._lock:
+            if kind is None:
+                setattr(self, name, getattr(self, name) + 1)
+            else:
+                self.failures[kind] = self.failures.get(kind, 0) + 1
+
+    def _sign_in(self, page):
+        self._count("relogins")
+        login(page, self.username, self.password)
+        try:
+            save_session(self.username, self.password, capture_session(page.context, page))
+        except Exception as e:
+            log_error(logger, ERROR_CODES['SESSION_ERROR'], f"Error saving session: {e}")
+
+    def restore(self, page, error, gr_no=None):
+        """Restore the page after error; returns (page to go on with, failure kind).
+
+        Raises BrowserLost when the page closed and no new one can be opened.
+        """
+        kind = self.classify(page, error)
+        self._count("failures", kind)
+        emit("step", step="Recovering the page", gr_no=gr_no)
+        with perf.span("recovery"):
+            if kind == "closed":
+                try:
+                    page = page.context.new_page()
+                    page.goto(EMIS_URL)
+                    wait_for_element(page, "app-main-layout, app-signin", name='login')
+                except Exception as e:
+                    log_error(logger, ERROR_CODES['RECOVERY_ERROR'], f"Error opening a new page: {e}", gr_no)
+                    raise BrowserLost(str(e)) from e
+            try:
+                if page_state(page)["signin"]:
+                    self._sign_in(page)
+                elif _close_overlays(page):
+                    _leave_to_dashboard(page)
+                if not page_is_healthy(page):
+                    self._count("reloads")
+                    ensure_healthy_page(page, gr_no)
+            except SignedOut:
+                try:
+                    self._sign_in(page)
+                except Exception as e:
+                    log_error(logger, ERROR_CODES['RECOVERY_ERROR'], f"Error signing in again: {e}", gr_no)
+            except Exception as e:
+                # The next row's health check reloads the page if it is still broken.
+                log_error(logger, ERROR_CODES['RECOVERY_ERROR'], f"Error restoring the page: {e}", gr_no)
+        return page, kind
+
+    def report(self):
+        failures = ", ".join(f"{count} {kind}" for kind, count in sorted(self.failures.items())) or "none"
+        return f"Recovery: failures {failures}; signed in again {self.relogins} time(s), reloaded {self.reloads} time(s)"
+
+def process_row(page, row, gr_index=None):
+    """Fill the portal for a single row of the preflight plan according to its Admission Type."""
+    ver = row["GR NO"]
+    if row["Admission Type"] == "New Admission":
+        # --- Navigate to Enrollment Section ---
+        navigate_to(page, "Add Student", ERROR_CODES['NAVIGATION_FAILED'], ver)
+        # Dropdowns are picked by their position in the form: mat-select ids
+        # keep counting up each time the form is opened, positions do not.
+        # --- Admission Details ---
+        select_dropdown(page, 0, "New Admission", ERROR_CODES['DROPDOWN_ERROR'], "Admission Type", ver, "FORM")
+        fill_date(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[1]/div/div/div[2]/div/div[2]/div[1]/mat-form-field/div/div[1]/div[3]/input", row["Admission Date"], ERROR_CODES['DATE_FORMAT_ERROR'], "Admission Date", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[1]/div/div/div[2]/div/div[2]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["GR NO"], ERROR_CODES['INPUT_ERROR'], "GR NO", ver) 
+        select_dropdown(page, 1, row['Class Admitted'], ERROR_CODES['DROPDOWN_ERROR'], "Class Admitted", ver, "FORM")
+        select_dropdown(page, 2, row['Current Class'], ERROR_CODES['DROPDOWN_ERROR'], "Current Class", ver, "FORM")
+        select_dropdown(page, 3, row['Select Section'], ERROR_CODES['DROPDOWN_ERROR'], "Select Section", ver, "FORM", parent=row['Current Class'])
+        select_dropdown(page, 4, row['Medium'], ERROR_CODES['DROPDOWN_ERROR'], "Medium", ver, "FORM")
+        select_dropdown(page, 5, row['Shift'], ERROR_CODES['DROPDOWN_ERROR'], "Shift", ver, "FORM")
+
+        # --- Student Details ---
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[1]/mat-form-field/div/div[1]/div[3]/input", row["Students Name"], ERROR_CODES['INPUT_ERROR'], "Students Name", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["Student Surname"], ERROR_CODES['INPUT_ERROR'], "Student Surname", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[3]/mat-form-field/div/div[1]/div[3]/input", row["B-FORM"], ERROR_CODES['INPUT_ERROR'], "B-FORM", ver) 
+        fill_date(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[4]/mat-form-field/div/div[1]/div[3]/input", row["Date Of Birth"], ERROR_CODES['DATE_FORMAT_ERROR'], "Date Of Birth", ver)
+        select_dropdown(page, 6, row['Gender'], ERROR_CODES['DROPDOWN_ERROR'], "Gender", ver, "FORM")
+        select_dropdown(page, 7, row['Religion'], ERROR_CODES['DROPDOWN_ERROR'], "Religion", ver, "FORM")
+        select_dropdown(page, 8, row['Disability'], ERROR_CODES['DROPDOWN_ERROR'], "Disability", ver, "FORM")
+        select_dropdown(page, 9, row['Blood Group'], ERROR_CODES['DROPDOWN_ERROR'], "Blood Group", ver, "FORM")
+        select_dropdown(page, 10, row['Mother Tongue'], ERROR_CODES['DROPDOWN_ERROR'], "Mother Tongue", ver, "FORM")
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[10]/mat-form-field/div/div[1]/div[3]/input", row["Emergency Contact Name"], ERROR_CODES['INPUT_ERROR'], "Emergency Contact Name", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[11]/mat-form-field/div/div[1]/div[3]/input", row["Emergency Contact Number"], ERROR_CODES['INPUT_ERROR'], "Emergency Contact Number", ver)
+        upload_image(page, ver, ERROR_CODES['IMAGE_UPLOAD_ERROR'])
+
+        # --- Location Details ---
+        select_dropdown(page, 11, row['Region'], ERROR_CODES['DROPDOWN_ERROR'], "Region", ver, "FORM")
+        select_dropdown(page, 12, row['District'], ERROR_CODES['DROPDOWN_ERROR'], "District", ver, "FORM", parent=row['Region']) 
+        select_dropdown(page, 13, row['Taluka'], ERROR_CODES['DROPDOWN_ERROR'], "Taluka", ver, "FORM", parent=row['District']) 
+        select_dropdown(page, 14, row['Union Coucil'], ERROR_CODES['DROPDOWN_ERROR'], "Union Coucil", ver, "FORM", parent=row['Taluka']) 
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[3]/div/div/div[2]/div[2]/div[1]/mat-form-field/div/div[1]/div[3]/textarea", row["Cily/Village/Area"], ERROR_CODES['INPUT_ERROR'], "Cily/Village/Area", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[3]/div/div/div[2]/div[2]/div[1]/mat-form-field/div/div[1]/div[3]/textarea", row["Address"], ERROR_CODES['ADDRESS_ERROR'], "Address", ver)
 
+        # --- Father's Details ---
+        select_dropdown(page, 15, row['Salutaion'], ERROR_CODES['DROPDOWN_ERROR'], "Salutaion", ver, "FORM")
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[1]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["Name"], ERROR_CODES['INPUT_ERROR'], "Father's Name", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[2]/div[1]/mat-form-field/div/div[1]/div[3]/input", row["Surname"], ERROR_CODES['INPUT_ERROR'], "Father's Surname", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[2]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["CNIC"], ERROR_CODES['INPUT_ERROR'], "CNIC", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[3]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["Mobile No"], ERROR_CODES['INPUT_ERROR'], "Mobile No", ver)
+        fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[4]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["Occupation"], ERROR_CODES['INPUT_ERROR'], "Occupation", ver)
+
+        # --- Qualification ---
+        select_dropdown(page, 16, row['Qualification'], ERROR_CODES['QUALIFICATION_ERROR'], "Qualification", ver, "FORM")
+
+        # --- Submit Form ---
+        # try:
+        #     page.click("xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/footer/div/div/button[1]")
+        #     time.sleep(1)
+        # except Exception as e:
+        #     log_error(logger, ERROR_CODES['INPUT_ERROR'], f'Error in Submit: {e}', ver)
+
+        # --- Prepare for Next Record ---
+        # Leaving the form destroys it, so the next Add Student starts from a
+        # blank one without reloading the whole app.
+        page.click("xpath=/html/body/app-root/app-main-layout/app-sidebar/div/aside/div/ul/li[3]/a")
+        wait_for_element(page, "app-add-student", state="detached", name='navigation')
+        wait_for_angular(page)
+    
+    elif row["Admission Type"] == "Promoted":
+        # Select student by GR NO
+        select_student_by_gr(page, ver, ERROR_CODES['STUDENT_SELECT_ERROR'], gr_index)
+
+        # Navigate to Status
+        Go_to_edit_Status(page, ERROR_CODES['STATUS_TAB_ERROR'], ver)
+
+        # Select 'Promoted' status from dropdown
+        select_dropdown(page, None, "Promoted", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT", parent=ver)
+
+        # Select new section from dropdown
+        select_dropdown(page, None, row['Select Section'], ERROR_CODES['DROPDOWN_ERROR'], "Section", ver, "TEXT", parent=ver)
+
+        # Click 'Add Status' button to confirm promotion
+        save_status(page, ERROR_CODES['SUBMIT_FORM_ERROR'], ver)
+        
+    elif row["Admission Type"] == "Retained":
+        # Select student by GR NO
+        select_student_by_gr(page, ver, ERROR_CODES['STUDENT_SELECT_ERROR'], gr_index)
+
+        # Navigate to Status tab
+        Go_to_edit_Status(page, ERROR_CODES['STATUS_TAB_ERROR'], ver)
+
+        # Select 'Retained' status
+        select_dropdown(page, None, "Retained", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT", parent=ver)
+
+        # Select new section
+        select_dropdown(page, None, row['Select Section'], ERROR_CODES['DROPDOWN_ERROR'], "Section", ver, "TEXT", parent=ver)
+
+        # Click 'Add Status' button
+        save_status(page, ERROR_CODES['SUBMIT_FORM_ERROR'], ver)
+        
+    elif row["Admission Type"] == "Passout":
+        # Select student by GR NO
+        select_student_by_gr(page, ver, ERROR_CODES['INPUT_ERROR'], gr_index)
+
+        # Navigate to Status tab
+        Go_to_edit_Status(page, ERROR_CODES['NAVIGATION_FAILED'], ver)
+
+        # Select 'Passout' status
+        select_dropdown(page, None, "Passout", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT", parent=ver)
+
+        # Click 'Add Status' button
+        save_status(page, ERROR_CODES['SUBMIT_FORM_ERROR'], ver)
+        
+    elif row["Admission Type"] == "Dropout":
+        # Select student by GR NO
+        select_student_by_gr(page, ver, ERROR_CODES['STUDENT_SELECT_ERROR'], gr_index)
+
+        # Navigate to Status tab
+        Go_to_edit_Status(page, ERROR_CODES['STATUS_TAB_ERROR'], ver)
+
+        # Select 'Dropout' status
+        select_dropdown(page, None, "Dropout", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT", parent=ver)
+
+        # Select dropout reason
+        select_dropdown(page, None, "Student is not punctual", ERROR_CODES['DROPDOWN_ERROR'], "Reason", ver, "TEXT", parent=ver)
+
+        # Click 'Add Status' button
+        save_status(page, ERROR_CODES['SUBMIT_FORM_ERROR'], ver)
+        
+    elif row["Admission Type"] == "TC":
+        # Select student by GR NO
+        select_student_by_gr(page, ver, ERROR_CODES['STUDENT_SELECT_ERROR'], gr_index)
+
+        # Navigate to Status tab
+        Go_to_edit_Status(page, ERROR_CODES['STATUS_TAB_ERROR'], ver)
+
+        # Select 'TC' status
+        select_dropdown(page, None, "TC", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT", parent=ver)
+
+        # Click 'Add Status' button
+        save_status(page, ERROR_CODES['SUBMIT_FORM_ERROR'], ver)
+
+def _learn_api_call(page, row, recorder, api_profile):
+    """Teach the API profile the backend calls the browser just made for a row."""
+    try:
+        wait_for_angular(page)
+        session = capture_session(page.context, page) if api_profile.auth is None else None
+        photo = photo_store.path_for(row["GR NO"]) if row["Admission Type"] == "New Admission" else None
+        api_profile.learn(row.to_dict(), recorder.take(), current_route(page), session, photo)
+    except Exception as e:
+        log_error(logger, ERROR_CODES['API_ERROR'], f"Error recording API calls: {e}", row["GR NO"])
+
+def _attempt_row(page, row, gr_index, journal, tracer, recorder, api_profile):
+    """Run one row on the page; returns the exception it failed with, or None."""
+    ver = row["GR NO"]
+    perf.set_row(ver, row["Admission Type"])
+    emit("step", step=row["Admission Type"], gr_no=ver)
+    if journal is not None:
+        journal.record(ver, row["Admission Type"], "started")
+    if recorder is not None:
+        recorder.clear()
+    started = time.perf_counter()
+    try:
+        if tracer is not None:
+            tracer.begin_row(page.context, ver)
+        with perf.span("row"):
+            ensure_healthy_page(page, ver)
+            process_row(page, row, gr_index)
+        if recorder is not None:
+            _learn_api_call(page, row, recorder, api_profile)
+        return None
+    except Exception as e:
+        return e
+    finally:
+        # Stop the chunk even when the page closed: Recovery opens the next
+        # page in the same context, which must not still be recording.
+        if tracer is not None:
+            try:
+                tracer.end_row(page.context, ver, row["Admission Type"], time.perf_counter() - started)
+            except Exception as e:
+                log_error(logger, ERROR_CODES['BROWSER_ERROR'], f"Error saving the row's trace: {e}", ver)
+
+def _fail_rows(rows, journal, reason):
+    """Mark (index, row) pairs a worker can no longer get to as failed, for Resume and the progress bar."""
+    for _, row in rows:
+        error_msg = log_error(logger, ERROR_CODES['BROWSER_ERROR'], f"Row not processed: {reason}", row["GR NO"])
+        if journal is not None:
+            journal.record(row["GR NO"], row["Admission Type"], "failed", error_msg)
+        emit("row", gr_no=row["GR NO"], status="failed", error=error_msg)
+
+def _process_rows(page, data, total, gr_index=None, journal=None, tracer=None, api_profile=None, recovery=None):
+    """Process the given rows on one page, skipping any row that fails.
+
+    With a Recovery, the page is restored after every failure and rows that
+    failed for a passing reason are queued and tried again after the others;
+    later rows of the same GR NO wait in the queue behind them. With an
+    ApiProfile, the backend calls behind every successful row are recorded
+    so later runs can send such rows without the browser. If the page is
+    lost or anything else stops the loop, every row not yet reported is
+    marked failed.
+    """
+    reported = set()
+
+    def report(index, gr_no, status, error=None):
+        emit("row", gr_no=gr_no, status=status, error=error)
+        reported.add(index)
+
+    try:
+        _run_rounds(page, data, total, gr_index, journal, tracer, api_profile, recovery, report)
+    except Exception as e:
+        if isinstance(e, BrowserLost):
+            reason = f"the browser page was lost ({e})"
+        else:
+            reason = f"the worker stopped ({e})"
+            log_error(logger, ERROR_CODES['BROWSER_ERROR'], f"Worker stopped: {e}")
+        _fail_rows([(i, row) for i, row in data.iterrows() if i not in reported], journal, reason)
+
+def _run_rounds(page, data, total, gr_index, journal, tracer, api_profile, recovery, report):
+    """The row loop of _process_rows: a first pass, then the retry rounds."""
+    recorder = CallRecorder(page.context) if api_profile is not None else None
+    if tracer is not None:
+        tracer.start(page.context)
+    rows = list(data.iterrows())
+    rounds = RETRY_ROUNDS if recovery is not None else 0
+    for round_no in range(rounds + 1):
+        final = round_no == rounds
+        retry, waiting = [], set()
+        for index, row in rows:
+            ver = row["GR NO"]
+            if str(ver) in waiting:
+                retry.append((index, row))
+                continue
+            error = _attempt_row(page, row, gr_index, journal, tracer, recorder, api_profile)
+            if error is None:
+                if journal is not None:
+                    journal.record(ver, row["Admission Type"], "done")
+                report(index, ver, "done")
+                print(f"Processed GR NO: {ver} (sheet row {index}, {total} rows)")
+                continue
+
+            # Any type of error will be logged and this GR NO will be skipped
+            error_msg = log_error(logger, ERROR_CODES['UNKNOWN_ERROR'], f"Error processing GR NO {ver}: {error}", ver)
+            if journal is not None:
+                journal.record(ver, row["Admission Type"], "failed", error_msg)
+            kind = None
+            if recovery is not None:
+                try:
+                    page, kind = recovery.restore(page, error, ver)
+                except BrowserLost:
+                    report(index, ver, "failed", error_msg)
+                    raise
+            if kind in RETRYABLE_FAILURES and not final:
+                emit("step", step="Will retry at the end of the run", gr_no=ver)
+                retry.append((index, row))
+                waiting.add(str(ver))
+            else:
+                report(index, ver, "failed", error_msg)
+        if not retry:
+            break
+        print(f"Retrying {len(retry)} row(s)")
+        rows = retry
+    if tracer is not None:
+        tracer.stop(page.context)
+
+# Rows run in blocks of one Admission Type, in this order, so consecutive rows
+# reuse the same form or the same student views.
+ACTION_ORDER = {kind: rank for rank, kind in enumerate(ADMISSION_TYPES)}
+
+def schedule_rows(data):
+    """Group rows by Admission Type, keeping the sheet order of each GR NO's own rows.
+
+    A GR NO's second row (say a status change after its admission) is placed
+    after every first row, so reordering never runs it before the earlier one.
+    """
+    order = pd.DataFrame({
+        "occurrence": data.groupby(data["GR NO"].astype(str)).cumcount(),
+        "rank": data["Admission Type"].map(ACTION_ORDER).fillna(len(ACTION_ORDER)),
+        "position": range(len(data)),
+    }, index=data.index)
+    return data.loc[order.sort_values(["occurrence", "rank", "position"]).index]
+
+def split_rows(data, workers: int):
+    """Split rows between workers, keeping every row of a GR NO on the same worker."""
+    codes = pd.factorize(data["GR NO"].astype(str))[0] % workers
+    return [data[codes == i] for i in range(workers) if (codes == i).any()]
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _worker(cdp_url, rows, Username, Password, total, gr_index, journal, session, router, tracer, api_profile, recovery):
+    """Drive one isolated browser context of the shared Chromium over CDP."""
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        page = browser.new_page()
+        try:
+            browser = p.chromium.connect_over_cdp(cdp_url)
+        except Exception as e:
+            log_error(logger, ERROR_CODES['BROWSER_ERROR'], f"Error connecting worker to browser: {e}")
+            _fail_rows(rows.iterrows(), journal, "the worker could not connect to the browser")
+            return
+        try:
+            context, page = open_session(browser, Username, Password, session, router)
+        except Exception as e:
+            _fail_rows(rows.iterrows(), journal, f"the worker could not sign in ({e})")
+            return
+        try:
+            _process_rows(page, rows, total, gr_index, journal, tracer, api_profile, recovery)
+        finally:
+            try:
+                context.close()
+            except Exception as e:
+                log_error(logger, ERROR_CODES['BROWSER_ERROR'], f"Error closing worker context: {e}")
+
+def _report_unchecked(verify):
+    """Report API rows as done when the browser never got to check them."""
+    if verify is not None:
+        for _, row in verify.iterrows():
+            emit("row", gr_no=row["GR NO"], status="done")
+
+def _fill_form_concurrent(rows, total, Username: str, Password: str, workers: int, gr_index, journal, router, tracer, api_profile=None, verify=None, recovery=None):
+    """Split the rows across several contexts of one shared Chromium process.
+
+    Chromium is launched once with a local DevTools port. Each worker thread
+    runs its own Playwright driver, attaches over CDP and works in a fresh
+    browser context, so cookies and storage stay isolated while the renderer
+    cost stays close to a single browser. The session is checked (or logged
+    in) once up front and every worker starts from a copy of it; rows sent
+    through the API are verified on that first page.
+    """
+    port = _free_port()
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=router is not None, args=[f"--remote-debugging-port={port}"])
+        try:
+            context, page = open_session(browser, Username, Password, router=router)
+        except Exception as e:
+            _fail_rows(rows.iterrows(), journal, f"could not sign in ({e})")
+            _report_unchecked(verify)
+            browser.close()
+            return
+        if verify is not None and not verify.empty:
+            rows = _with_redone(rows, _verify_api_rows(page, verify, journal, api_profile))
+        session = capture_session(context, page)
+        context.close()
+        chunks = split_rows(rows, workers)
+        threads = [
+            threading.Thread(target=_worker, args=(f"http://127.0.0.1:{port}", chunk, Username, Password, total, gr_index, journal, session, router, tracer, api_profile, recovery), daemon=True)
+            for chunk in chunks
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        browser.close()
 
-        # --- Login ---
+def _fill_form_single(rows, total, Username: str, Password: str, gr_index, journal, router, tracer, api_profile=None, verify=None, recovery=None):
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=router is not None)
+
+        # --- Login (or reuse the cached session) ---
         try:
-            page.goto("https://emis.sef.edu.pk/")
-            page.wait_for_timeout(2000)
-            page.fill("xpath=/html/body/app-root/app-auth-layout/app-signin/div/div/div[2]/div/div/form/div[1]/div/mat-form-field/div/div[1]/div[3]/input", Username)
-            page.fill("xpath=/html/body/app-root/app-auth-layout/app-signin/div/div/div[2]/div/div/form/div[2]/div/mat-form-field/div/div[1]/div[3]/input", Password)
-            page.click("xpath=/html/body/app-root/app-auth-layout/app-signin/div/div/div[2]/div/div/form/div[3]/div/button")
-            page.wait_for_timeout(10000)
+            context, page = open_session(browser, Username, Password, router=router)
         except Exception as e:
-            log_error(logger, ERROR_CODES['LOGIN_FAILED'], f"Error in login: {e}")
+            _fail_rows(rows.iterrows(), journal, f"could not sign in ({e})")
+            _report_unchecked(verify)
             browser.close()
             return
 
+        if verify is not None and not verify.empty:
+            rows = _with_redone(rows, _verify_api_rows(page, verify, journal, api_profile))
+
         # --- Iterate Through Excel Rows ---
-        len1 = len(data)
-        for index, row in data.iterrows():
-            ver = row["GR NO"]
-            try:
-                # Any error in this block will skip this GR NO and continue to the next
-                if row["Admission Type"] == "New Admission":
-                    # --- Navigate to Enrollment Section ---
-                    navigate_to(page, "Add Student", ERROR_CODES['NAVIGATION_FAILED'], ver)
-                    # --- Admission Details ---
-                    select_dropdown(page, "mat-select-0", "New Admission", ERROR_CODES['DROPDOWN_ERROR'], "Admission Type", ver) 
-                    fill_date(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[1]/div/div/div[2]/div/div[2]/div[1]/mat-form-field/div/div[1]/div[3]/input", row["Admission Date"], ERROR_CODES['DATE_FORMAT_ERROR'], "Admission Date", ver)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[1]/div/div/div[2]/div/div[2]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["GR NO"], ERROR_CODES['INPUT_ERROR'], "GR NO", ver) 
-                    select_dropdown(page, "mat-select-2", row['Class Admitted'], ERROR_CODES['DROPDOWN_ERROR'], "Class Admitted", ver) 
-                    select_dropdown(page, "mat-select-4", row['Current Class'], ERROR_CODES['DROPDOWN_ERROR'], "Current Class", ver) 
-                    select_dropdown(page, "mat-select-6", row['Select Section'], ERROR_CODES['DROPDOWN_ERROR'], "Select Section", ver)
-                    select_dropdown(page, "mat-select-8", row['Medium'], ERROR_CODES['DROPDOWN_ERROR'], "Medium", ver)
-                    select_dropdown(page, "mat-select-10", row['Shift'], ERROR_CODES['DROPDOWN_ERROR'], "Shift", ver)
-
-                    # --- Student Details ---
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[1]/mat-form-field/div/div[1]/div[3]/input", row["Students Name"], ERROR_CODES['INPUT_ERROR'], "Students Name", ver)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["Student Surname"], ERROR_CODES['INPUT_ERROR'], "Student Surname", ver)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[3]/mat-form-field/div/div[1]/div[3]/input", row["B-FORM"], ERROR_CODES['INPUT_ERROR'], "B-FORM", ver, is_int=True) 
-                    fill_date(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[4]/mat-form-field/div/div[1]/div[3]/input", row["Date Of Birth"], ERROR_CODES['DATE_FORMAT_ERROR'], "Date Of Birth", ver)
-                    select_dropdown(page, "mat-select-12", row['Gender'], ERROR_CODES['DROPDOWN_ERROR'], "Gender", ver) 
-                    religion_value = "Muslim" if row["Religion"] == 'Islam' else "Non Muslim"
-                    select_dropdown(page, "mat-select-14", religion_value, ERROR_CODES['DROPDOWN_ERROR'], "Religion", ver) 
-                    disability_value = "NO" if str(row["Disability"]).lower() == "no" else str(row["Disability"])
-                    select_dropdown(page, "mat-select-16", disability_value, ERROR_CODES['DROPDOWN_ERROR'], "Disability", ver) 
-                    blood_group_value = "N/A" if pd.isna(row['Blood Group']) else str(row['Blood Group'])
-                    select_dropdown(page, "mat-select-18", blood_group_value, ERROR_CODES['DROPDOWN_ERROR'], "Blood Group", ver) 
-                    select_dropdown(page, "mat-select-20", row['Mother Tongue'], ERROR_CODES['DROPDOWN_ERROR'], "Mother Tongue", ver) 
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[10]/mat-form-field/div/div[1]/div[3]/input", row["Emergency Contact Name"], ERROR_CODES['INPUT_ERROR'], "Emergency Contact Name", ver)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[2]/div/div/div[2]/div[1]/div[11]/mat-form-field/div/div[1]/div[3]/input", row["Emergency Contact Number"], ERROR_CODES['INPUT_ERROR'], "Emergency Contact Number", ver, is_int=True)
-                    upload_image(page, ver, ERROR_CODES['IMAGE_UPLOAD_ERROR'])
-
-                    # --- Location Details ---
-                    select_dropdown(page, "mat-select-22", row['Region'], ERROR_CODES['DROPDOWN_ERROR'], "Region", ver) 
-                    select_dropdown(page, "mat-select-24", row['District'], ERROR_CODES['DROPDOWN_ERROR'], "District", ver) 
-                    select_dropdown(page, "mat-select-26", row['Taluka'], ERROR_CODES['DROPDOWN_ERROR'], "Taluka", ver) 
-                    select_dropdown(page, "mat-select-28", row['Union Coucil'], ERROR_CODES['DROPDOWN_ERROR'], "Union Coucil", ver) 
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[3]/div/div/div[2]/div[2]/div[1]/mat-form-field/div/div[1]/div[3]/textarea", row["Cily/Village/Area"], ERROR_CODES['INPUT_ERROR'], "Cily/Village/Area", ver)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[3]/div/div/div[2]/div[2]/div[1]/mat-form-field/div/div[1]/div[3]/textarea", row["Address"], ERROR_CODES['ADDRESS_ERROR'], "Address", ver)
-
-                    # --- Father's Details ---
-                    select_dropdown(page, "mat-select-30", row['Salutaion'], ERROR_CODES['DROPDOWN_ERROR'], "Salutaion", ver) 
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[1]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["Name"], ERROR_CODES['INPUT_ERROR'], "Father's Name", ver)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[2]/div[1]/mat-form-field/div/div[1]/div[3]/input", row["Surname"], ERROR_CODES['INPUT_ERROR'], "Father's Surname", ver)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[2]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["CNIC"], ERROR_CODES['INPUT_ERROR'], "CNIC", ver, is_int=True)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[3]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["Mobile No"], ERROR_CODES['INPUT_ERROR'], "Mobile No", ver, is_int=True)
-                    fill_input(page, "xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/div[5]/div/div/div[2]/div/div[4]/div[2]/mat-form-field/div/div[1]/div[3]/input", row["Occupation"], ERROR_CODES['INPUT_ERROR'], "Occupation", ver)
-
-                    # --- Qualification ---
-                    qualification_value = "Matriculation" if row['Qualification'] in ["Primary", "Matric"] else row['Qualification']
-                    select_dropdown(page, "mat-select-32", qualification_value, ERROR_CODES['QUALIFICATION_ERROR'], "Qualification", ver)
-
-                    # --- Submit Form ---
-                    # try:
-                    #     page.click("xpath=/html/body/app-root/app-main-layout/div/app-add-student/section/div/div[2]/div/div/div[2]/form/footer/div/div/button[1]")
-                    #     time.sleep(1)
-                    # except Exception as e:
-                    #     log_error(logger, ERROR_CODES['INPUT_ERROR'], f'Error in Submit: {e}', ver)
-
-                    # --- Prepare for Next Record ---
-                    page.click("xpath=/html/body/app-root/app-main-layout/app-sidebar/div/aside/div/ul/li[3]/a")
-                    page.wait_for_timeout(3000)
-                    page.reload()
-                
-                elif row["Admission Type"] == "Promoted":
-                    # Select student by GR NO
-                    select_student_by_gr(page, ver, ERROR_CODES['STUDENT_SELECT_ERROR'])
-
-                    # Navigate to Status
-                    Go_to_edit_Status(page, ERROR_CODES['STATUS_TAB_ERROR'], ver)
-
-                    # Select 'Promoted' status from dropdown
-                    select_dropdown(page, None, "Promoted", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT")
-
-                    # Select new section from dropdown
-                    select_dropdown(page, None, row['Select Section'], ERROR_CODES['DROPDOWN_ERROR'], "Section", ver, "TEXT")
-
-                    # Click 'Add Status' button to confirm promotion
-                    page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div/div[2]/div/form/div/div/div/div[2]/div[2]/div/button[1]")
-                    
-                elif row["Admission Type"] == "Retained":
-                    # Select student by GR NO
-                    select_student_by_gr(page, ver, ERROR_CODES['STUDENT_SELECT_ERROR'])
-
-                    # Navigate to Status tab
-                    Go_to_edit_Status(page, ERROR_CODES['STATUS_TAB_ERROR'], ver)
-
-                    # Select 'Retained' status
-                    select_dropdown(page, None, "Retained", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT")
-
-                    # Select new section
-                    select_dropdown(page, None, row['Select Section'], ERROR_CODES['DROPDOWN_ERROR'], "Section", ver, "TEXT")
-
-                    # Click 'Add Status' button
-                    page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div/div[2]/div/form/div/div/div/div[2]/div[2]/div/button[1]")
-                    
-                elif row["Admission Type"] == "Passout":
-                    # Select student by GR NO
-                    select_student_by_gr(page, ver, ERROR_CODES['INPUT_ERROR'])
-
-                    # Navigate to Status tab
-                    Go_to_edit_Status(page, ERROR_CODES['NAVIGATION_FAILED'], ver)
-
-                    # Select 'Passout' status
-                    select_dropdown(page, None, "Passout", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT")
-
-                    # Click 'Add Status' button
-                    page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div/div[2]/div/form/div/div/div/div[2]/div[2]/div/button[1]")
-                    
-                elif row["Admission Type"] == "Dropout":
-                    # Select student by GR NO
-                    select_student_by_gr(page, ver, ERROR_CODES['STUDENT_SELECT_ERROR'])
-
-                    # Navigate to Status tab
-                    Go_to_edit_Status(page, ERROR_CODES['STATUS_TAB_ERROR'], ver)
-
-                    # Select 'Dropout' status
-                    select_dropdown(page, None, "Dropout", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT")
-
-                    # Select dropout reason
-                    select_dropdown(page, None, "Student is not punctual", ERROR_CODES['DROPDOWN_ERROR'], "Reason", ver, "TEXT")
-
-                    # Click 'Add Status' button
-                    page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div/div[2]/div/form/div/div/div/div[2]/div[2]/div/button[1]")
-                    
-                elif row["Admission Type"] == "TC":
-                    # Select student by GR NO
-                    select_student_by_gr(page, ver, ERROR_CODES['STUDENT_SELECT_ERROR'])
-
-                    # Navigate to Status tab
-                    Go_to_edit_Status(page, ERROR_CODES['STATUS_TAB_ERROR'], ver)
-
-                    # Select 'TC' status
-                    select_dropdown(page, None, "TC", ERROR_CODES['DROPDOWN_ERROR'], "Status", ver, "TEXT")
-
-                    # Click 'Add Status' button
-                    page.click("xpath=/html/body/app-root/app-main-layout/div/app-about-student/section/div/div[2]/div[3]/div/mat-tab-group/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div/div[2]/div/form/div/div/div/div[2]/div[2]/div/button[1]")
-                
-                print(f"Processed GR NO: {ver} ({index+1} of {len1})")
-            except Exception as e:
-                # Any type of error will be logged and this GR NO will be skipped
-                log_error(logger, ERROR_CODES['UNKNOWN_ERROR'], f"Error processing GR NO {ver}: {e}", ver)
-                continue  # Skip this GR NO and continue to next
+        _process_rows(page, rows, total, gr_index, journal, tracer, api_profile, recovery)
         browser.close()
 
+# API-submitted rows checked in the browser afterwards, per Admission Type and
+# run: more while its call is newly learned, fewer once the profile trusts it.
+API_VERIFY_SAMPLE = 3
+API_VERIFY_NEW = 10
+
+def _submit_via_api(rows, Username: str, Password: str, workers: int, gr_index, journal, api_profile):
+    """Send the rows the API profile knows how to submit straight to the backend.
+
+    Uses the cached browser session. Returns (rows left for the browser,
+    sample of sent rows to verify in the browser); rows the API could not
+    send fall back to the browser. Sampled rows are reported done only once
+    the browser has checked them (see _verify_api_rows). Only the leading rows of each GR NO go
+    out: from its first row of a type the profile cannot send yet, the rest
+    of that GR NO is left to the browser so its rows keep their order.
+    """
+    nothing = rows.iloc[0:0]
+    session = load_session(Username, Password)
+    not_ready = ~rows["Admission Type"].map(api_profile.ready).astype(bool)
+    blocked = not_ready.astype(int).groupby(rows["GR NO"].astype(str)).cummax().astype(bool)
+    eligible = rows[~blocked]
+    if session is None or eligible.empty:
+        return rows, nothing
+
+    emit("step", step=f"Submitting {len(eligible)} row(s) through the API")
+    for _, row in eligible.iterrows():
+        journal.record(row["GR NO"], row["Admission Type"], "started")
+    engine = ApiEngine(EMIS_URL, api_profile, session, workers, gr_index=gr_index, photo_for=photo_store.path_for)
+    try:
+        with perf.span("api_submit"):
+            results = engine.run(eligible)
+    except Exception as e:
+        log_error(logger, ERROR_CODES['API_ERROR'], f"API submission failed, using the browser: {e}")
+        return rows, nothing
+
+    sent = [index for index, error in results.items() if error is None]
+    samples = []
+    for admission_type, of_type in rows.loc[sent].groupby("Admission Type"):
+        size = API_VERIFY_SAMPLE if api_profile.trusted(admission_type) else API_VERIFY_NEW
+        samples.append(of_type.sample(min(size, len(of_type)), random_state=0))
+    verify = pd.concat(samples) if samples else nothing
+    for index, error in results.items():
+        row = rows.loc[index]
+        if error is None:
+            # Journaled done straight away so a crash never sends it twice.
+            journal.record(row["GR NO"], row["Admission Type"], "done")
+            if index not in verify.index:
+                emit("row", gr_no=row["GR NO"], status="done")
+        else:
+            log_error(logger, ERROR_CODES['API_ERROR'], f"API submission failed, using the browser: {error}", row["GR NO"])
+    print(f"Sent {len(sent)} row(s) through the API, {len(eligible) - len(sent)} left to the browser")
+    return rows.drop(index=sent), verify
+
+def _verify_api_rows(page, verify, journal, api_profile):
+    """Check a sample of API-submitted rows in the portal's own pages.
+
+    A new student must be found in the Student List; a status row must show
+    its status (and section) in the student's status history. A row that
+    does not makes the API profile forget that Admission Type, so it is
+    learned again from the browser, and is returned with the others that
+    failed for the browser to redo.
+    """
+    redo = []
+    for index, row in verify.iterrows():
+        gr_no = row["GR NO"]
+        emit("step", step="Verifying API submission", gr_no=gr_no)
+        try:
+            select_student_by_gr(page, gr_no, ERROR_CODES['API_ERROR'])
+            if row["Admission Type"] != "New Admission":
+                expected = [row["Admission Type"]]
+                if row["Admission Type"] in ("Promoted", "Retained"):
+                    expected.append(str(row["Select Section"]))
+                history = status_history(page)
+                missing = [value for value in expected if value not in history]
+                if missing:
+                    raise LookupError(f"{', '.join(missing)} not in the status history")
+        except Exception as e:
+            error_msg = log_error(logger, ERROR_CODES['API_ERROR'], f"API submission not found in the portal, using the browser: {e}", gr_no)
+            journal.record(gr_no, row["Admission Type"], "failed", error_msg)
+            api_profile.forget(row["Admission Type"])
+            redo.append(index)
+            continue
+        api_profile.verified(row["Admission Type"])
+        emit("row", gr_no=gr_no, status="done")
+    return verify.loc[redo]
+
+def _with_redone(rows, redo):
+    """Put API rows that failed their check back in front of the browser's rows."""
+    return schedule_rows(pd.concat([redo, rows])) if not redo.empty else rows
+
+def _fill_form_sync(data, Username: str, Password: str, workers: int = 1, run_id=None, select=RESUME, lean=False, trace_slowest=0, api=False):
+    """Fill the portal for every row of the sheet that the run journal has not finished.
+
+    Rows run grouped by Admission Type (see schedule_rows). Re-running the
+    same sheet (same run_id) skips rows already done or interrupted; select
+    picks which rows to take up instead (see Journal.pending_rows). lean runs
+    Chromium headless and skips images, fonts, analytics and re-downloads of
+    static bundles. Step timings go to runs/<run_id>.timings.jsonl and, with
+    trace_slowest > 0, Playwright traces of that many slowest rows are kept.
+    A failed row leaves the page restored for the next one (see Recovery)
+    and, unless its data was at fault, is tried once more at the end.
+    With api, rows whose backend call has been learned are sent directly (see
+    api_engine) and the browser handles the rest, learning as it goes.
+    """
+    data.columns = data.columns.str.strip()
+    option_cache.clear()
+    journal = Journal(run_id or run_id_for(data))
+    gr_index = GrIndex(Username)
+    router = AssetRouter() if lean else None
+    data, rejected = prepare(data)
+    for _, bad in rejected.iterrows():
+        log_error(logger, ERROR_CODES['DATA_PARSE_ERROR'], f"Row {bad['Row']} rejected: {bad['Reason']}", bad["GR NO"])
+
+    # New admissions without a photo would fail at the upload step; skip them now.
+    photo_store.build_index()
+    admissions = data["Admission Type"] == "New Admission"
+    no_photo = admissions & data["GR NO"].isin(photo_store.missing(data.loc[admissions, "GR NO"]))
+    for gr_no in data.loc[no_photo, "GR NO"]:
+        log_error(logger, ERROR_CODES['IMAGE_UPLOAD_ERROR'], f"Image not found for GR {gr_no}, row skipped", gr_no)
+    data = data[~no_photo]
+    photo_store.optimize(data.loc[admissions[~no_photo], "GR NO"])
+    rows = schedule_rows(journal.pending_rows(data, select))
+    if len(rows) < len(data):
+        print(f"Skipping {len(data) - len(rows)} row(s) already handled in run {journal.run_id}")
+    emit("start", total=len(data), pending=len(rows), rejected=len(rejected) + int(no_photo.sum()), run_id=journal.run_id)
+    perf.start_recording(journal.run_id)
+    tracer = perf.SlowRowTracer(journal.run_id, trace_slowest) if trace_slowest else None
+    api_profile = ApiProfile(EMIS_URL) if api else None
+    recovery = Recovery(Username, Password)
+    verify = None
+    try:
+        if api_profile is not None and not rows.empty:
+            rows, verify = _submit_via_api(rows, Username, Password, workers, gr_index, journal, api_profile)
+        if rows.empty and (verify is None or verify.empty):
+            return
+        if workers > 1:
+            _fill_form_concurrent(rows, len(data), Username, Password, workers, gr_index, journal, router, tracer, api_profile, verify, recovery)
+        else:
+            _fill_form_single(rows, len(data), Username, Password, gr_index, journal, router, tracer, api_profile, verify, recovery)
+    finally:
+        if api_profile is not None:
+            api_profile.save()
+        journal.close()
+        gr_index.save()
+        perf.stop_recording()
+        print(perf.build_report(journal.run_id).to_string(index=False))
+        for report in ([router.report()] if router is not None else []) + [recovery.report()]:
+            print(report)
+            emit("report", text=report)
+
 # --- Main Form Filling Logic ---
-def fill_form_from_excel(data, Username, Password):
-    process = multiprocessing.Process(target=_fill_form_sync, args=(data, Username, Password))
+# Seconds the bot process waits at exit for the UI to take its last events.
+EVENT_FLUSH_TIMEOUT = 10
+
+def _flush_events(events, timeout=EVENT_FLUSH_TIMEOUT):
+    """Hand every queued event to the UI, giving up if nobody drains the queue."""
+    events.close()
+    flusher = threading.Thread(target=events.join_thread, daemon=True)
+    flusher.start()
+    flusher.join(timeout)
+    if flusher.is_alive():
+        # The tab was closed: drop the unsent events instead of blocking at exit.
+        events.cancel_join_thread()
+
+def _run_with_progress(events, *args):
+    set_event_queue(events)
+    try:
+        _fill_form_sync(*args)
+    finally:
+        emit("finished")
+        _flush_events(events)
+
+def start_fill_form(data, Username, Password, workers=1, run_id=None, select=RESUME, lean=False, trace_slowest=0, api=False):
+    """Start filling the portal in a background process without waiting for it.
+
+    Returns the process and a queue of progress events ("start", "step",
+    "row", "report", "finished") that the caller drains at its own pace, e.g. with
+    progress.ProgressTracker.
+    """
+    events = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_with_progress, args=(events, data, Username, Password, workers, run_id, select, lean, trace_slowest, api))
+    process.start()
+    return process, events
+
+def fill_form_from_excel(data, Username, Password, workers=1, run_id=None, select=RESUME, lean=False, trace_slowest=0, api=False):
+    process = multiprocessing.Process(target=_fill_form_sync, args=(data, Username, Password, workers, run_id, select, lean, trace_slowest, api))
     process.start()
     process.join()
 
@@ -351,4 +1267,4 @@ if __name__ == '__main__':
     try:
         multiprocessing.freeze_support()
     except Exception as e:
-        log_error(logger, ERROR_CODES['UNKNOWN_ERROR'], f"Error: {e}", None)
\ No newline at end of file
+        log_error(logger, ERROR_CODES['UNKNOWN_ERROR'], f"Error: {e}", None)
@@ -0,0 +1,74 @@
+import os
+import re
+import json
+import time
+import threading
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+# Routes of students rarely change, but re-check them after a week anyway.
+INDEX_TTL = 7 * 24 * 60 * 60
+
+
+class GrIndex:
+    """On-disk map of GR NO to the student's detail route in the portal.
+
+    Entries are filled in lazily as students are looked up, shared by every
+    worker of a run and saved per username so later runs can skip the
+    Student List search altogether.
+    """
+
+    def __init__(self, username: str, path=None, ttl=INDEX_TTL):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", username) or "default"
+        self.path = path or os.path.join(CACHE_DIR, f"gr_index_{safe_name}.json")
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """Load the cached index, dropping entries older than the TTL."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        now = time.time()
+        self._entries = {
+            gr: entry for gr, entry in entries.items()
+            if now - entry.get("seen", 0) < self.ttl
+        }
+
+    def get(self, gr_no):
+        """Return the cached route for a GR NO, or None."""
+        with self._lock:
+            entry = self._entries.get(str(gr_no))
+        if entry and time.time() - entry["seen"] < self.ttl:
+            return entry["route"]
+        return None
+
+    def add(self, gr_no, route: str):
+        with self._lock:
+            self._entries[str(gr_no)] = {"route": route, "seen": time.time()}
+            self._dirty = True
+
+    def invalidate(self, gr_no):
+        """Forget a GR NO whose cached route no longer opens its student."""
+        with self._lock:
+            if self._entries.pop(str(gr_no), None) is not None:
+                self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import pandas as pd
+
+RUNS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runs")
+
+# Every record is flushed to the OS straight away, which survives a crash of
+# the bot or of Chromium. fsync (which also survives a power cut) is batched.
+FSYNC_EVERY = 10
+FSYNC_INTERVAL = 2.0
+
+# Which rows of a sheet a run takes up (see Journal.pending_rows).
+RESUME = "resume"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+
+def run_id_for(data):
+    """Stable id for a sheet, so re-uploading the same file resumes its run."""
+    hashed = pd.util.hash_pandas_object(data.astype(str), index=False).values
+    digest = hashlib.sha256(hashed.tobytes())
+    digest.update("|".join(map(str, data.columns)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def row_key(gr_no, admission_type):
+    """Journal key of a row: GR NO plus Admission Type."""
+    if isinstance(gr_no, float) and gr_no.is_integer():
+        gr_no = int(gr_no)
+    return f"{str(gr_no).strip()}|{str(admission_type).strip()}"
+
+
+def journal_path(run_id: str):
+    return os.path.join(RUNS_DIR, f"{run_id}.jsonl")
+
+
+def read_states(run_id: str):
+    """Return the latest state of every row key recorded for a run."""
+    states = {}
+    try:
+        with open(journal_path(run_id), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write.
+                    continue
+                states[entry["key"]] = entry
+    except FileNotFoundError:
+        pass
+    return states
+
+
+def journal_summary(run_id: str):
+    """Count rows per latest state (done, failed, started) for a run."""
+    summary = {"done": 0, "failed": 0, "started": 0}
+    for entry in read_states(run_id).values():
+        summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+    return summary
+
+
+def reset_journal(run_id: str):
+    """Start a run over, keeping the previous journal as a .bak file."""
+    path = journal_path(run_id)
+    if os.path.exists(path):
+        os.replace(path, f"{path}.{int(time.time())}.bak")
+
+
+class Journal:
+    """Append-only JSONL journal of per-row progress for one run.
+
+    A row is "started" before the browser touches it and "done" or "failed"
+    afterwards. A row whose last state is "started" was interrupted and may
+    or may not have reached the portal.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.path = journal_path(run_id)
+        self.states = read_states(run_id)
+        os.makedirs(RUNS_DIR, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def record(self, gr_no, admission_type, status: str, error=None):
+        key = row_key(gr_no, admission_type)
+        entry = {"key": key, "status": status, "ts": time.time()}
+        if error is not None:
+            entry["error"] = str(error)
+        with self._lock:
+            self.states[key] = entry
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= FSYNC_EVERY or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def status(self, gr_no, admission_type):
+        entry = self.states.get(row_key(gr_no, admission_type))
+        return entry["status"] if entry else None
+
+    def pending_rows(self, data, select=RESUME):
+        """Rows still to do.
+
+        RESUME takes the rows never run and the failed ones; interrupted rows
+        are left out, since a second status entry in the portal cannot be
+        undone. FAILED takes only the failed rows, INTERRUPTED only the
+        interrupted ones, for when the operator has checked the portal.
+        """
+        keys = [row_key(gr, kind) for gr, kind in zip(data["GR NO"], data["Admission Type"])]
+        statuses = pd.Series([self.states.get(k, {}).get("status") for k in keys], index=data.index)
+        if select == FAILED:
+            return data[statuses == "failed"]
+        if select == INTERRUPTED:
+            return data[statuses == "started"]
+        return data[statuses.isna() | (statuses == "failed")]
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
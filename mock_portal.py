@@ -0,0 +1,705 @@
+import re
+import json
+import time
+import random
+import secrets
+import argparse
+import threading
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Labels offered by every dropdown of the mock portal. Generated benchmark
+# sheets draw their values from here, so every row can be typed in.
+CLASSES = ["ECE", "I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+SECTIONS = ["A", "B", "C", "D"]
+STATUSES = ["Promoted", "Retained", "Passout", "Dropout", "TC"]
+
+VOCABULARY = {
+    "Admission Type": ["New Admission", "Transfer In"],
+    "Class Admitted": CLASSES,
+    "Current Class": CLASSES,
+    "Select Section": SECTIONS,
+    "Medium": ["Sindhi", "Urdu", "English"],
+    "Shift": ["Morning", "Afternoon"],
+    "Gender": ["Male", "Female"],
+    "Religion": ["Muslim", "Non Muslim"],
+    "Disability": ["NO", "YES"],
+    "Blood Group": ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-", "N/A"],
+    "Mother Tongue": ["Sindhi", "Urdu", "Punjabi", "Pashto", "Balochi", "Saraiki", "Other"],
+    "Region": ["Karachi", "Hyderabad", "Sukkur", "Larkana", "Mirpurkhas"],
+    "District": ["Karachi East", "Karachi West", "Hyderabad", "Sukkur", "Larkana"],
+    "Taluka": ["Gulshan", "Saddar", "Latifabad", "Rohri", "Ratodero"],
+    "Union Coucil": [f"UC-{i}" for i in range(1, 11)],
+    "Salutaion": ["Mr", "Mrs", "Ms"],
+    "Qualification": ["Illiterate", "Matriculation", "Intermediate", "Graduate", "Masters"],
+    "Status": STATUSES,
+    "Section": SECTIONS,
+    "Reason": ["Student is not punctual", "Family relocated", "Financial reasons"],
+    "Items per page": ["10", "25", "50", "100"],
+}
+
+_STEP = re.compile(r"^([\w-]+)(?:\[(\d+)\])?$")
+_VOID_TAGS = {"input"}
+
+
+class _Element:
+    def __init__(self, tag):
+        self.tag = tag
+        self.attrs = {}
+        self.text = ""
+        self.children = []
+
+    def child(self, tag, position=1):
+        """The position-th child with this tag (1-based), adding empty ones as needed."""
+        same = [c for c in self.children if c.tag == tag]
+        while len(same) < position:
+            element = _Element(tag)
+            self.children.append(element)
+            same.append(element)
+        return same[position - 1]
+
+    def render(self):
+        attrs = "".join(f' {k}="{v}"' for k, v in self.attrs.items())
+        if self.tag in _VOID_TAGS:
+            return f"<{self.tag}{attrs}/>"
+        inner = self.text + "".join(c.render() for c in self.children)
+        return f"<{self.tag}{attrs}>{inner}</{self.tag}>"
+
+
+def build_view(root_tag, nodes):
+    """Render a component from (path, attrs, text) nodes.
+
+    Paths are the XPath steps below the component (div[2]/form/...), exactly
+    as bot.py addresses them; missing siblings are filled in so that every
+    positional index in the bot's XPaths lands on the intended element.
+    """
+    root = _Element(root_tag)
+    for path, attrs, text in nodes:
+        element = root
+        for step in path.split("/"):
+            tag, position = _STEP.match(step).groups()
+            element = element.child(tag, int(position or 1))
+        element.attrs.update(attrs)
+        element.text = text or element.text
+    return root.render()
+
+
+def _field(path, key, tag="input", **attrs):
+    """A Material form field with its input at the depth the portal nests it."""
+    return (f"{path}/mat-form-field/div/div[1]/div[3]/{tag}", {"data-key": key, **attrs}, "")
+
+
+def _select(path, field, key):
+    return (f"{path}/mat-form-field/mat-select", {"data-field": field, "data-key": key}, "")
+
+
+SIGNIN = "app-signin/div/div/div[2]/div/div/form"
+
+SIGNIN_NODES = [
+    ("app-signin/div/div/div[1]/h2", {}, "EMIS Sign In"),
+    _field(f"{SIGNIN}/div[1]/div", "username", type="text"),
+    _field(f"{SIGNIN}/div[2]/div", "password", type="password"),
+    (f"{SIGNIN}/div[3]/div/button", {"type": "button", "data-action": "signin"}, "Sign In"),
+]
+
+SIDEBAR = "app-sidebar/div/aside/div/ul"
+
+LAYOUT_NODES = [
+    (f"{SIDEBAR}/li[1]/a", {"href": "#"}, "Home"),
+    (f"{SIDEBAR}/li[2]/a", {"href": "#"}, "Profile"),
+    (f"{SIDEBAR}/li[3]/a", {"href": "/dashboard", "data-route": "/dashboard"}, "Dashboard"),
+    (f"{SIDEBAR}/li[4]/a", {"href": "#"}, "Schools"),
+    (f"{SIDEBAR}/li[5]/a", {"href": "#", "data-toggle": "students"}, "Students"),
+    (f"{SIDEBAR}/li[5]/ul", {"class": "hidden", "data-menu": "students"}, ""),
+    (f"{SIDEBAR}/li[5]/ul/li[1]/a", {"href": "/student/all", "data-route": "/student/all"}, "Student List"),
+    (f"{SIDEBAR}/li[5]/ul/li[2]/a", {"href": "/student/add", "data-route": "/student/add"}, "Add Student"),
+    ("div", {"class": "outlet"}, ""),
+]
+
+DASHBOARD_NODES = [("section/div/h3", {}, "Dashboard")]
+
+FORM = "section/div/div[2]/div/div/div[2]/form"
+ADMISSION = f"{FORM}/div[1]/div/div/div[2]/div"
+STUDENT = f"{FORM}/div[2]/div/div/div[2]"
+LOCATION = f"{FORM}/div[3]/div/div/div[2]"
+FATHER = f"{FORM}/div[5]/div/div/div[2]/div"
+
+# The mat-selects appear in the same order as the portal's, so a fresh form
+# numbers them mat-select-0, -2, ... -32 like the real one.
+ADD_STUDENT_NODES = [
+    _select(f"{ADMISSION}/div[1]/div[1]", "Admission Type", "admissionType"),
+    _select(f"{ADMISSION}/div[1]/div[2]", "Class Admitted", "classAdmitted"),
+    _select(f"{ADMISSION}/div[1]/div[3]", "Current Class", "currentClass"),
+    _select(f"{ADMISSION}/div[1]/div[4]", "Select Section", "section"),
+    _select(f"{ADMISSION}/div[1]/div[5]", "Medium", "medium"),
+    _select(f"{ADMISSION}/div[1]/div[6]", "Shift", "shift"),
+    _field(f"{ADMISSION}/div[2]/div[1]", "admissionDate", type="text"),
+    _field(f"{ADMISSION}/div[2]/div[2]", "grNo", type="text"),
+    _field(f"{STUDENT}/div[1]/div[1]", "studentName", type="text"),
+    _field(f"{STUDENT}/div[1]/div[2]", "studentSurname", type="text"),
+    _field(f"{STUDENT}/div[1]/div[3]", "bForm", type="text"),
+    _field(f"{STUDENT}/div[1]/div[4]", "dateOfBirth", type="text"),
+    _select(f"{STUDENT}/div[1]/div[5]", "Gender", "gender"),
+    _select(f"{STUDENT}/div[1]/div[6]", "Religion", "religion"),
+    _select(f"{STUDENT}/div[1]/div[7]", "Disability", "disability"),
+    _select(f"{STUDENT}/div[1]/div[8]", "Blood Group", "bloodGroup"),
+    _select(f"{STUDENT}/div[1]/div[9]", "Mother Tongue", "motherTongue"),
+    _field(f"{STUDENT}/div[1]/div[10]", "emergencyContactName", type="text"),
+    _field(f"{STUDENT}/div[1]/div[11]", "emergencyContactNumber", type="text"),
+    (f"{STUDENT}/div[2]/div[1]/app-file-upload/div/input", {"type": "file", "data-key": "photo"}, ""),
+    _select(f"{LOCATION}/div[1]/div[1]", "Region", "region"),
+    _select(f"{LOCATION}/div[1]/div[2]", "District", "district"),
+    _select(f"{LOCATION}/div[1]/div[3]", "Taluka", "taluka"),
+    _select(f"{LOCATION}/div[1]/div[4]", "Union Coucil", "unionCouncil"),
+    _field(f"{LOCATION}/div[2]/div[1]", "address", tag="textarea"),
+    _select(f"{FATHER}/div[1]/div[1]", "Salutaion", "fatherSalutation"),
+    _field(f"{FATHER}/div[1]/div[2]", "fatherName", type="text"),
+    _field(f"{FATHER}/div[2]/div[1]", "fatherSurname", type="text"),
+    _field(f"{FATHER}/div[2]/div[2]", "fatherCnic", type="text"),
+    _field(f"{FATHER}/div[3]/div[2]", "fatherMobile", type="text"),
+    _select(f"{FATHER}/div[4]/div[1]", "Qualification", "fatherQualification"),
+    _field(f"{FATHER}/div[4]/div[2]", "fatherOccupation", type="text"),
+    (f"{FORM}/footer/div/div/button[1]", {"type": "button", "data-action": "submit"}, "Submit"),
+    (f"{FORM}/footer/div/div/button[2]", {"type": "button", "data-action": "reset"}, "Reset"),
+]
+
+LIST = "section/div/div[2]/div/div/div/div/div/div"
+
+ALL_STUDENTS_NODES = [
+    (f"{LIST}/div[1]/div/div[1]/ul/li[1]/h2", {}, "All Students"),
+    (f"{LIST}/div[1]/div/div[1]/ul/li[2]/input", {"type": "text", "data-key": "search"}, ""),
+    (f"{LIST}/div[1]/div/div[1]/ul/li[3]/div/button", {"type": "button", "data-action": "search"}, "Search"),
+    (f"{LIST}/div[2]/mat-table", {}, ""),
+    (f"{LIST}/div[3]/mat-paginator/div/mat-form-field/mat-select", {"data-field": "Items per page", "aria-label": "Items per page:"}, ""),
+]
+
+TABS = "section/div/div[2]/div[3]/div/mat-tab-group"
+STATUS = f"{TABS}/div/mat-tab-body[3]/div/div/div/student-academic-year-status/div"
+STATUS_FORM = f"{STATUS}/div[2]/div/form/div/div/div"
+
+ABOUT_STUDENT_NODES = [
+    ("section/div/div[2]/div[1]/h4/span[1]", {"data-key": "grNo"}, ""),
+    ("section/div/div[2]/div[1]/h4/span[2]", {"data-key": "name"}, ""),
+    (f"{TABS}/mat-tab-header/div/div/div/div[1]/div", {"data-tab": "1"}, "Profile"),
+    (f"{TABS}/mat-tab-header/div/div/div/div[2]/div", {"data-tab": "2"}, "Academics"),
+    (f"{TABS}/mat-tab-header/div/div/div/div[3]/div", {"data-tab": "3"}, "Status"),
+    (f"{TABS}/div/mat-tab-body[1]/div", {}, "Profile"),
+    (f"{TABS}/div/mat-tab-body[2]", {"class": "hidden"}, ""),
+    (f"{TABS}/div/mat-tab-body[3]", {"class": "hidden"}, ""),
+    (f"{STATUS}/div[1]/div[1]", {"data-role": "history"}, ""),
+    (f"{STATUS}/div[1]/div[2]/div/button", {"type": "button", "data-action": "change-status"}, "Change Status"),
+    (f"{STATUS}/div[2]", {"class": "hidden", "data-role": "status-form"}, ""),
+    (f"{STATUS_FORM}/div[1]/div[1]/mat-form-field/mat-label", {}, "Status"),
+    (f"{STATUS_FORM}/div[1]/div[1]/mat-form-field/mat-select", {"data-field": "Status", "data-key": "status"}, ""),
+    (f"{STATUS_FORM}/div[1]/div[2]/mat-form-field/mat-label", {}, "Section"),
+    (f"{STATUS_FORM}/div[1]/div[2]/mat-form-field/mat-select", {"data-field": "Section", "data-key": "section"}, ""),
+    (f"{STATUS_FORM}/div[1]/div[3]/mat-form-field/mat-label", {}, "Reason"),
+    (f"{STATUS_FORM}/div[1]/div[3]/mat-form-field/mat-select", {"data-field": "Reason", "data-key": "reason"}, ""),
+    (f"{STATUS_FORM}/div[2]/div[2]/div/button[1]", {"type": "button", "data-action": "add-status"}, "Add Status"),
+    (f"{STATUS_FORM}/div[2]/div[2]/div/button[2]", {"type": "button", "data-action": "cancel-status"}, "Cancel"),
+]
+
+VIEWS = {
+    "signin": build_view("app-auth-layout", SIGNIN_NODES),
+    "layout": build_view("app-main-layout", LAYOUT_NODES),
+    "dashboard": build_view("app-dashboard", DASHBOARD_NODES),
+    "addStudent": build_view("app-add-student", ADD_STUDENT_NODES),
+    "allStudents": build_view("app-all-students", ALL_STUDENTS_NODES),
+    "aboutStudent": build_view("app-about-student", ABOUT_STUDENT_NODES),
+}
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>EMIS (mock)</title>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  app-main-layout, app-auth-layout, section, mat-form-field, mat-table, mat-tab-body { display: block; }
+  app-sidebar { display: block; float: left; width: 200px; }
+  .outlet { margin-left: 220px; padding: 8px; }
+  mat-form-field { margin: 4px 0; }
+  mat-select { display: inline-block; min-width: 160px; min-height: 1.2em; border-bottom: 1px solid #888; cursor: pointer; }
+  mat-row, mat-header-row { display: flex; }
+  mat-cell, mat-header-cell { flex: 1; padding: 4px; }
+  mat-tab-header div[data-tab] { display: inline-block; padding: 4px 12px; cursor: pointer; }
+  .cdk-overlay-backdrop { position: fixed; inset: 0; z-index: 1000; }
+  .cdk-overlay-pane { position: fixed; top: 10%; left: 30%; z-index: 1001; background: #fff; border: 1px solid #ccc; max-height: 70vh; overflow: auto; }
+  mat-option { display: block; padding: 4px 12px; cursor: pointer; }
+  .snackbar { position: fixed; bottom: 8px; right: 8px; background: #333; color: #fff; padding: 8px; }
+  .hidden { display: none; }
+</style>
+</head>
+<body>
+<app-root></app-root>
+<div class="cdk-overlay-container"></div>
+<script>
+const VIEWS = __VIEWS__;
+const OPTIONS = __OPTIONS__;
+window.__loggedIn = __LOGGED_IN__;
+
+// Like Angular's: in-flight requests make the app unstable, and mat-select
+// ids come from a counter that only a full page load resets.
+let pending = 0;
+let selectCounter = 0;
+let listSeq = 0;
+window.getAllAngularTestabilities = () => [{isStable: () => pending === 0}];
+
+function toast(message) {
+  const bar = document.createElement('div');
+  bar.className = 'snackbar';
+  bar.textContent = message;
+  document.body.appendChild(bar);
+  setTimeout(() => bar.remove(), 3000);
+}
+
+function signOut() {
+  localStorage.removeItem('token');
+  window.__loggedIn = false;
+  history.pushState({}, '', '/signin');
+  render();
+}
+
+function api(method, url, body) {
+  const headers = {'Content-Type': 'application/json'};
+  const token = localStorage.getItem('token');
+  if (token) headers['Authorization'] = 'Bearer ' + token;
+  pending++;
+  return fetch(url, {method, headers, body: body === undefined ? undefined : JSON.stringify(body)})
+    .then(response => {
+      if (response.status === 401) {
+        signOut();
+        throw new Error('session expired');
+      }
+      if (!response.ok) {
+        toast('Request failed (' + response.status + ')');
+        throw new Error(String(response.status));
+      }
+      return response.json();
+    })
+    .finally(() => { pending--; });
+}
+
+function go(path) {
+  history.pushState({}, '', path);
+  render();
+}
+
+function closeOverlay() {
+  document.querySelector('.cdk-overlay-container').innerHTML = '';
+}
+
+function setValue(select, label) {
+  select.dataset.value = label;
+  select.querySelector('.mat-select-value').textContent = label;
+  select.dispatchEvent(new Event('change'));
+}
+
+function openSelect(select) {
+  closeOverlay();
+  const backdrop = document.createElement('div');
+  backdrop.className = 'cdk-overlay-backdrop';
+  backdrop.addEventListener('click', closeOverlay);
+  const pane = document.createElement('div');
+  pane.className = 'cdk-overlay-pane';
+  const list = document.createElement('div');
+  list.setAttribute('role', 'listbox');
+  for (const label of OPTIONS[select.dataset.field] || []) {
+    const option = document.createElement('mat-option');
+    option.setAttribute('role', 'option');
+    const text = document.createElement('span');
+    text.textContent = ' ' + label + ' ';
+    option.appendChild(text);
+    option.addEventListener('click', () => { setValue(select, label); closeOverlay(); });
+    list.appendChild(option);
+  }
+  pane.appendChild(list);
+  document.querySelector('.cdk-overlay-container').append(backdrop, pane);
+}
+
+document.addEventListener('keydown', event => { if (event.key === 'Escape') closeOverlay(); });
+
+function bindSelects(scope) {
+  for (const select of scope.querySelectorAll('mat-select')) {
+    select.id = 'mat-select-' + selectCounter;
+    selectCounter += 2;
+    select.setAttribute('role', 'combobox');
+    select.innerHTML = '<span class="mat-select-value"></span>';
+    select.addEventListener('click', () => openSelect(select));
+  }
+}
+
+function formValues(scope) {
+  const values = {};
+  for (const field of scope.querySelectorAll('[data-key]')) {
+    if (field.tagName === 'MAT-SELECT') values[field.dataset.key] = field.dataset.value || null;
+    else if (field.type === 'file') values[field.dataset.key] = field.files.length ? field.files[0].name : null;
+    else values[field.dataset.key] = field.value || null;
+  }
+  return values;
+}
+
+function resetForm(scope) {
+  for (const field of scope.querySelectorAll('[data-key]')) {
+    if (field.tagName === 'MAT-SELECT') {
+      delete field.dataset.value;
+      field.querySelector('.mat-select-value').textContent = '';
+    } else {
+      field.value = '';
+    }
+  }
+}
+
+function bindSignin(root) {
+  root.querySelector('[data-action="signin"]').addEventListener('click', () => {
+    const credentials = formValues(root);
+    api('POST', '/api/login', credentials).then(result => {
+      localStorage.setItem('token', result.token);
+      window.__loggedIn = true;
+      go('/dashboard');
+    }, () => {});
+  });
+}
+
+function bindSidebar(root) {
+  for (const link of root.querySelectorAll('[data-route]')) {
+    link.addEventListener('click', event => { event.preventDefault(); go(link.dataset.route); });
+  }
+  root.querySelector('[data-toggle]').addEventListener('click', event => {
+    event.preventDefault();
+    root.querySelector('[data-menu]').classList.remove('hidden');
+  });
+}
+
+function showAddStudent(outlet) {
+  outlet.innerHTML = VIEWS.addStudent;
+  bindSelects(outlet);
+  const form = outlet.querySelector('form');
+  form.querySelector('[data-action="submit"]').addEventListener('click', () => {
+    api('POST', '/api/students', formValues(form)).then(() => { toast('Student added'); resetForm(form); }, () => {});
+  });
+  form.querySelector('[data-action="reset"]').addEventListener('click', () => resetForm(form));
+}
+
+function renderTable(table, students) {
+  table.innerHTML = '<mat-header-row><mat-header-cell>GR NO</mat-header-cell><mat-header-cell>Name</mat-header-cell><mat-header-cell></mat-header-cell></mat-header-row>';
+  for (const student of students) {
+    const row = document.createElement('mat-row');
+    row.innerHTML = '<mat-cell class="cdk-column-grNo"></mat-cell><mat-cell class="cdk-column-name"></mat-cell>'
+      + '<mat-cell class="cdk-column-actions"><button mat-icon-button type="button">View</button></mat-cell>';
+    row.children[0].textContent = student.grNo;
+    row.children[1].textContent = student.name;
+    row.querySelector('button').addEventListener('click', () => go('/student/about/' + student.id));
+    table.appendChild(row);
+  }
+}
+
+function showAllStudents(outlet) {
+  outlet.innerHTML = VIEWS.allStudents;
+  bindSelects(outlet);
+  const pageSize = outlet.querySelector('mat-select[data-field="Items per page"]');
+  setValue(pageSize, '10');
+  const search = outlet.querySelector('[data-key="search"]');
+  const table = outlet.querySelector('mat-table');
+  const load = () => {
+    // Only the latest request may fill the table, as with switchMap.
+    const seq = ++listSeq;
+    const query = new URLSearchParams({search: search.value.trim(), size: pageSize.dataset.value});
+    api('GET', '/api/students?' + query).then(students => { if (seq === listSeq) renderTable(table, students); }, () => {});
+  };
+  pageSize.addEventListener('change', load);
+  outlet.querySelector('[data-action="search"]').addEventListener('click', load);
+  load();
+}
+
+function showAboutStudent(outlet, id) {
+  outlet.innerHTML = '';
+  api('GET', '/api/students/' + id).then(student => {
+    if (location.pathname !== '/student/about/' + id) return;
+    outlet.innerHTML = VIEWS.aboutStudent;
+    outlet.querySelector('[data-key="grNo"]').textContent = student.grNo;
+    outlet.querySelector('[data-key="name"]').textContent = ' ' + student.name;
+    bindSelects(outlet);
+    const bodies = outlet.querySelectorAll('mat-tab-body');
+    for (const tab of outlet.querySelectorAll('[data-tab]')) {
+      tab.addEventListener('click', () => {
+        bodies.forEach((body, i) => body.classList.toggle('hidden', String(i + 1) !== tab.dataset.tab));
+      });
+    }
+    const history = outlet.querySelector('[data-role="history"]');
+    const statusForm = outlet.querySelector('[data-role="status-form"]');
+    const showHistory = statuses => {
+      history.textContent = statuses.map(s => s.status + (s.section ? ' (' + s.section + ')' : '')).join(', ');
+    };
+    showHistory(student.statuses);
+    outlet.querySelector('[data-action="change-status"]').addEventListener('click', () => statusForm.classList.remove('hidden'));
+    outlet.querySelector('[data-action="cancel-status"]').addEventListener('click', () => statusForm.classList.add('hidden'));
+    outlet.querySelector('[data-action="add-status"]').addEventListener('click', () => {
+      api('POST', '/api/students/' + id + '/status', formValues(statusForm)).then(result => {
+        showHistory(result.statuses);
+        resetForm(statusForm);
+        statusForm.classList.add('hidden');
+        toast('Status added');
+      }, () => {});
+    });
+  }, () => { outlet.innerHTML = '<div class="not-found">Student not found</div>'; });
+}
+
+function render() {
+  closeOverlay();
+  const root = document.querySelector('app-root');
+  if (!window.__loggedIn) {
+    root.innerHTML = VIEWS.signin;
+    bindSignin(root);
+    return;
+  }
+  root.innerHTML = VIEWS.layout;
+  bindSidebar(root);
+  const outlet = root.querySelector('app-main-layout > div');
+  const path = location.pathname;
+  const about = path.match(/^\\/student\\/about\\/(\\d+)$/);
+  if (path === '/student/add') showAddStudent(outlet);
+  else if (path === '/student/all') showAllStudents(outlet);
+  else if (about) showAboutStudent(outlet, about[1]);
+  else outlet.innerHTML = VIEWS.dashboard;
+}
+
+window.addEventListener('popstate', render);
+render();
+</script>
+</body>
+</html>
+"""
+
+
+class MockPortal:
+    """A local stand-in for the EMIS portal, for benchmarks and offline runs.
+
+    Serves a single-page app whose sign-in page, sidebar, add-student form,
+    student list and status tab have the DOM structure bot.py relies on,
+    backed by a small in-memory JSON API. Every API call waits `latency`
+    seconds (give or take `jitter` as a fraction) and fails with HTTP 503 at
+    `failure_rate`, so slow and flaky days at the portal can be reproduced.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 session_ttl=8 * 60 * 60, username=None, password=None, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.session_ttl = session_ttl
+        self.username = username
+        self.password = password
+        self.students = {}
+        self.sessions = {}
+        self.api_log = []
+        self._random = random.Random(seed)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self):
+        """Serve in a background thread; returns the portal's URL."""
+        handler = type("Handler", (_Handler,), {"portal": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def seed_students(self, gr_nos, name="Student"):
+        """Add existing students that status rows can be applied to."""
+        with self._lock:
+            for gr_no in gr_nos:
+                self._add_student({"grNo": str(gr_no), "studentName": f"{name} {gr_no}"})
+
+    def stored_statuses(self):
+        """(GR NO, status) of every status the portal has stored."""
+        with self._lock:
+            return [(s["grNo"], status["status"]) for s in self.students.values() for status in s["statuses"]]
+
+    def expire_sessions(self):
+        """Sign every browser out, as the portal does when a session times out."""
+        with self._lock:
+            self.sessions.clear()
+
+    def _add_student(self, fields):
+        student = {"id": self._next_id, "grNo": fields["grNo"], "name": fields.get("studentName") or "", "fields": fields, "statuses": []}
+        self.students[student["id"]] = student
+        self._next_id += 1
+        return student
+
+    def _session_valid(self, token):
+        with self._lock:
+            expires = self.sessions.get(token)
+        return expires is not None and expires > time.time()
+
+    def page(self, token):
+        logged_in = self._session_valid(token)
+        return (
+            PAGE.replace("__VIEWS__", json.dumps(VIEWS))
+            .replace("__OPTIONS__", json.dumps(VOCABULARY))
+            .replace("__LOGGED_IN__", json.dumps(logged_in))
+        )
+
+    def handle_api(self, method, path, query, body, token):
+        """Answer one API call; returns (status, payload, extra headers)."""
+        if self.latency:
+            time.sleep(max(0.0, self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))))
+        result = self._route(method, path, query, body, token)
+        with self._lock:
+            self.api_log.append({"method": method, "path": path, "body": body, "status": result[0], "ts": time.time()})
+        return result
+
+    def _route(self, method, path, query, body, token):
+        if (method, path) == ("POST", "/api/login"):
+            return self._login(body)
+        if not self._session_valid(token):
+            return 401, {"error": "Session expired"}, {}
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            return 503, {"error": "Service unavailable"}, {}
+
+        if (method, path) == ("GET", "/api/students"):
+            return self._list_students(query)
+        if (method, path) == ("POST", "/api/students"):
+            return self._create_student(body)
+        match = re.fullmatch(r"/api/students/(\d+)(/status)?", path)
+        if match:
+            with self._lock:
+                student = self.students.get(int(match.group(1)))
+            if student is None:
+                return 404, {"error": "Student not found"}, {}
+            if method == "GET" and not match.group(2):
+                return 200, self._public(student), {}
+            if method == "POST" and match.group(2):
+                return self._add_status(student, body)
+        return 404, {"error": "Not found"}, {}
+
+    def _login(self, body):
+        username, password = body.get("username"), body.get("password")
+        if not username or not password:
+            return 400, {"error": "Username and password are required"}, {}
+        if self.username is not None and (username, password) != (self.username, self.password):
+            return 401, {"error": "Invalid credentials"}, {}
+        token = secrets.token_hex(16)
+        with self._lock:
+            self.sessions[token] = time.time() + self.session_ttl
+        return 200, {"token": token}, {"Set-Cookie": f"session={token}; Path=/; HttpOnly; SameSite=Lax"}
+
+    def _public(self, student):
+        return {"id": student["id"], "grNo": student["grNo"], "name": student["name"], "statuses": student["statuses"]}
+
+    def _list_students(self, query):
+        search = query.get("search", [""])[0].strip()
+        size = int(query.get("size", ["10"])[0] or 10)
+        with self._lock:
+            found = [s for s in self.students.values() if search in s["grNo"]][:size]
+        return 200, [self._public(s) for s in found], {}
+
+    def _create_student(self, body):
+        if not body.get("grNo") or not body.get("studentName"):
+            return 400, {"error": "GR NO and name are required"}, {}
+        with self._lock:
+            if any(s["grNo"] == body["grNo"] for s in self.students.values()):
+                return 409, {"error": f"GR NO {body['grNo']} already exists"}, {}
+            student = self._add_student(body)
+        return 200, self._public(student), {}
+
+    def _add_status(self, student, body):
+        status = body.get("status")
+        if status not in STATUSES:
+            return 400, {"error": "Status is required"}, {}
+        if status in ("Promoted", "Retained") and not body.get("section"):
+            return 400, {"error": "Section is required"}, {}
+        if status == "Dropout" and not body.get("reason"):
+            return 400, {"error": "Reason is required"}, {}
+        with self._lock:
+            student["statuses"].append({"status": status, "section": body.get("section"), "reason": body.get("reason")})
+        return 200, self._public(student), {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    portal = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _token(self):
+        auth = self.headers.get("Authorization", "")
+        if auth.startswith("Bearer "):
+            return auth[len("Bearer "):]
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        return cookie["session"].value if "session" in cookie else None
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _send(self, status, body: bytes, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        body = self._read_json() if method == "POST" else {}
+        if url.path.startswith("/api/"):
+            status, payload, headers = self.portal.handle_api(method, url.path, parse_qs(url.query), body, self._token())
+            self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+        elif method == "GET" and url.path != "/favicon.ico":
+            self._send(200, self.portal.page(self._token()).encode("utf-8"), "text/html; charset=utf-8")
+        else:
+            self._send(404, b"Not found", "text/plain")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local mock of the EMIS portal.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency spread, as a fraction of --latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of API calls answered with HTTP 503")
+    parser.add_argument("--students", type=int, default=0, help="students to seed, GR NO 1..N")
+    args = parser.parse_args()
+
+    portal = MockPortal(args.host, args.port, args.latency, args.jitter, args.failure_rate)
+    portal.seed_students(range(1, args.students + 1))
+    print(f"Mock EMIS portal at {portal.start()} (set EMIS_URL to use it)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        portal.stop()
+
+
+if __name__ == "__main__":
+    main()
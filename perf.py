@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import heapq
+import functools
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from journal import RUNS_DIR
+
+# The row being processed by the current worker thread, used to tag spans.
+_row = threading.local()
+_recorder = None
+
+
+def timings_path(run_id: str):
+    return os.path.join(RUNS_DIR, f"{run_id}.timings.jsonl")
+
+
+class SpanRecorder:
+    """Writes one JSON line per timed step to runs/<run_id>.timings.jsonl."""
+
+    def __init__(self, run_id: str):
+        os.makedirs(RUNS_DIR, exist_ok=True)
+        self.path = timings_path(run_id)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, step: str, ms: float, ok: bool):
+        entry = {
+            "step": step,
+            "gr_no": getattr(_row, "gr_no", None),
+            "admission_type": getattr(_row, "admission_type", None),
+            "ms": round(ms, 1),
+            "ok": ok,
+            "ts": time.time(),
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def start_recording(run_id: str):
+    global _recorder
+    _recorder = SpanRecorder(run_id)
+
+
+def stop_recording():
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def set_row(gr_no, admission_type):
+    """Tag the spans of this thread with the row being processed."""
+    _row.gr_no = None if gr_no is None else str(gr_no)
+    _row.admission_type = admission_type
+
+
+def record(step: str, ms: float, ok=True):
+    if _recorder is not None:
+        _recorder.record(step, ms, ok)
+
+
+@contextmanager
+def span(step: str):
+    """Time a block and record it as a span of the current row."""
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        record(step, (time.perf_counter() - started) * 1000, ok)
+
+
+def timed(step: str):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(step):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _p50(values):
+    return values.quantile(0.5)
+
+
+def _p95(values):
+    return values.quantile(0.95)
+
+
+def build_report(run_id: str):
+    """p50, p95 and max (ms) per step, overall and per Admission Type."""
+    try:
+        spans = pd.read_json(timings_path(run_id), lines=True)
+    except (FileNotFoundError, ValueError):
+        return pd.DataFrame()
+    if spans.empty:
+        return spans
+    stats = {"count": "count", "p50": _p50, "p95": _p95, "max": "max"}
+    overall = spans.groupby("step")["ms"].agg(**stats).reset_index()
+    overall.insert(0, "admission_type", "All")
+    per_type = spans.dropna(subset=["admission_type"]).groupby(["admission_type", "step"])["ms"].agg(**stats).reset_index()
+    report = pd.concat([overall, per_type], ignore_index=True)
+    return report.round({"p50": 0, "p95": 0, "max": 0})
+
+
+class SlowRowTracer:
+    """Keeps Playwright traces of the slowest rows of a run.
+
+    Each context records one trace chunk per row; a chunk is written to
+    runs/<run_id>-traces only while it is among the `keep` slowest so far.
+    """
+
+    def __init__(self, run_id: str, keep=5):
+        self.dir = os.path.join(RUNS_DIR, f"{run_id}-traces")
+        self.keep = keep
+        self._slowest = []  # min-heap of (seconds, path)
+        self._lock = threading.Lock()
+
+    def start(self, context):
+        context.tracing.start(screenshots=True, snapshots=True)
+
+    def begin_row(self, context, gr_no):
+        context.tracing.start_chunk(title=f"GR NO {gr_no}")
+
+    def end_row(self, context, gr_no, admission_type, seconds: float):
+        path = evicted = None
+        name = f"{seconds:07.1f}s-{admission_type}-{gr_no}.zip".replace(" ", "_")
+        with self._lock:
+            if len(self._slowest) < self.keep:
+                path = os.path.join(self.dir, name)
+                heapq.heappush(self._slowest, (seconds, path))
+            elif seconds > self._slowest[0][0]:
+                path = os.path.join(self.dir, name)
+                evicted = heapq.heapreplace(self._slowest, (seconds, path))[1]
+        if path is None:
+            context.tracing.stop_chunk()
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        context.tracing.stop_chunk(path=path)
+        if evicted is not None:
+            try:
+                os.remove(evicted)
+            except FileNotFoundError:
+                pass
+
+    def stop(self, context):
+        try:
+            context.tracing.stop()
+        except Exception:
+            pass
@@ -0,0 +1,147 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+PHOTO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Photos")
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Photos are sent to the portal at most this large; bigger phone pictures are
+# downscaled and recompressed to a JPEG under the limit before the run.
+MAX_PHOTO_BYTES = 200 * 1024
+MAX_PHOTO_SIDE = 1024
+JPEG_QUALITIES = (85, 75, 65, 55, 45, 35)
+
+MANIFEST_NAME = ".manifest.json"
+OPTIMIZED_DIR = "optimized"
+
+
+def _optimize_photo(source: str, target: str, max_bytes: int):
+    """Write a JPEG copy of source under max_bytes; returns the bytes saved."""
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((MAX_PHOTO_SIDE, MAX_PHOTO_SIDE))
+        for quality in JPEG_QUALITIES:
+            image.save(tmp_path, "JPEG", quality=quality, optimize=True)
+            if os.path.getsize(tmp_path) <= max_bytes:
+                break
+    os.replace(tmp_path, target)
+    return os.path.getsize(source) - os.path.getsize(target)
+
+
+class PhotoStore:
+    """The Photos folder, indexed by GR NO.
+
+    A photo belongs to a student when its file name (without extension) is
+    the GR NO; .jpg, .jpeg and .png are accepted in any letter case.
+    Oversized photos get an optimized JPEG next to them, which is what the
+    bot uploads.
+    """
+
+    def __init__(self, photo_dir=PHOTO_DIR, max_bytes=MAX_PHOTO_BYTES):
+        self.photo_dir = photo_dir
+        self.optimized_dir = os.path.join(photo_dir, OPTIMIZED_DIR)
+        self.max_bytes = max_bytes
+        self.index = {}
+        self._lock = threading.Lock()
+
+    def _manifest_path(self):
+        return os.path.join(self.photo_dir, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_uploads(self, files):
+        """Save uploaded files (objects with .name and .getvalue()), skipping unchanged ones.
+
+        Returns (saved, unchanged) counts.
+        """
+        with self._lock:
+            os.makedirs(self.photo_dir, exist_ok=True)
+            manifest = self._load_manifest()
+            saved = unchanged = 0
+            for upload in files:
+                name = os.path.basename(upload.name)
+                content = upload.getvalue()
+                digest = hashlib.sha256(content).hexdigest()
+                path = os.path.join(self.photo_dir, name)
+                if manifest.get(name) == digest and os.path.exists(path):
+                    unchanged += 1
+                    continue
+                with open(path, "wb") as f:
+                    f.write(content)
+                manifest[name] = digest
+                saved += 1
+            with open(self._manifest_path(), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+        self.build_index()
+        return saved, unchanged
+
+    def build_index(self):
+        """Map every GR NO in the folder to its photo file."""
+        index = {}
+        try:
+            entries = sorted(os.scandir(self.photo_dir), key=lambda e: e.name)
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if entry.is_file() and ext.lower() in PHOTO_EXTENSIONS:
+                # Prefer .jpg over .png when both exist for the same GR NO.
+                if stem.strip() not in index or ext.lower() != ".png":
+                    index[stem.strip()] = entry.path
+        self.index = index
+        return index
+
+    def source_for(self, gr_no):
+        return self.index.get(str(gr_no).strip())
+
+    def path_for(self, gr_no):
+        """The file to upload for a GR NO (optimized copy if any), or None."""
+        source = self.source_for(gr_no)
+        if source is None:
+            return None
+        return source if self._is_stale(source) else self._optimized_path(source)
+
+    def missing(self, gr_nos):
+        """GR NOs from the list that have no photo."""
+        return [gr for gr in gr_nos if self.source_for(gr) is None]
+
+    def _optimized_path(self, source: str):
+        stem = os.path.splitext(os.path.basename(source))[0]
+        return os.path.join(self.optimized_dir, f"{stem}.jpg")
+
+    def _is_stale(self, source: str):
+        """True when source has no optimized copy newer than itself."""
+        optimized = self._optimized_path(source)
+        return not os.path.exists(optimized) or os.path.getmtime(optimized) < os.path.getmtime(source)
+
+    def optimize(self, gr_nos=None, max_workers=None):
+        """Shrink oversized photos in a thread pool.
+
+        Threads, not processes: Pillow releases the GIL while decoding and
+        encoding, and forking the multi-threaded Streamlit server can deadlock.
+
+        Only photos above max_bytes without an up-to-date optimized copy are
+        processed. Returns (count, bytes_saved).
+        """
+        sources = self.index.values() if gr_nos is None else filter(None, map(self.source_for, gr_nos))
+        jobs = [
+            (source, self._optimized_path(source))
+            for source in sources
+            if os.path.getsize(source) > self.max_bytes and self._is_stale(source)
+        ]
+        if not jobs:
+            return 0, 0
+        os.makedirs(self.optimized_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            saved = list(pool.map(_optimize_photo, *zip(*jobs), [self.max_bytes] * len(jobs)))
+        return len(jobs), sum(saved)
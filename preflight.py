@@ -0,0 +1,165 @@
+import io
+
+import pandas as pd
+from openpyxl import load_workbook
+
+ADMISSION_TYPES = ["New Admission", "Promoted", "Retained", "Passout", "Dropout", "TC"]
+
+# Columns the bot reads; anything else in the sheet is dropped from the plan.
+PLAN_COLUMNS = [
+    "Admission Type", "Admission Date", "GR NO", "Class Admitted", "Current Class",
+    "Select Section", "Medium", "Shift", "Students Name", "Student Surname", "B-FORM",
+    "Date Of Birth", "Gender", "Religion", "Disability", "Blood Group", "Mother Tongue",
+    "Emergency Contact Name", "Emergency Contact Number", "Region", "District", "Taluka",
+    "Union Coucil", "Cily/Village/Area", "Address", "Salutaion", "Name", "Surname", "CNIC",
+    "Mobile No", "Occupation", "Qualification",
+]
+
+DATE_COLUMNS = ["Admission Date", "Date Of Birth"]
+
+# Identifiers that Excel may store as numbers; read as text so nothing is
+# lost to float rounding or dropped leading zeros.
+TEXT_COLUMNS = ["GR NO", "B-FORM", "CNIC", "Emergency Contact Number", "Mobile No"]
+
+# Digit-only columns and the length they must have once typed. The portal is
+# given numbers without leading zeros, as the bot has always typed them.
+DIGIT_COLUMNS = {
+    "B-FORM": 13,
+    "CNIC": 13,
+    "Emergency Contact Number": 10,
+    "Mobile No": 10,
+}
+
+# Values a dropdown is known to accept, checked after the mappings below.
+VOCABULARIES = {
+    "Admission Type": ADMISSION_TYPES,
+    "Religion": ["Muslim", "Non Muslim"],
+    "Blood Group": ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-", "N/A"],
+}
+
+# Fields without which a row cannot be typed into the portal.
+REQUIRED_COLUMNS = {
+    "New Admission": [
+        "Class Admitted", "Current Class", "Select Section", "Medium", "Shift",
+        "Students Name", "Gender", "Mother Tongue", "Region", "District", "Taluka",
+        "Union Coucil", "Salutaion", "Qualification",
+    ],
+    "Promoted": ["Select Section"],
+    "Retained": ["Select Section"],
+}
+
+
+def read_workbook(content: bytes, columns=PLAN_COLUMNS):
+    """Stream the first sheet of an .xlsx file into a DataFrame.
+
+    The workbook is opened read-only, so rows are parsed one at a time and
+    only the requested columns are kept. Returns (header, data), where
+    header is the sheet's full header row for comparing against the template
+    and data is indexed by Excel row number, blank rows left out.
+    """
+    workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(c) if c is not None else "" for c in next(rows, ())]
+        positions = [header.index(c) for c in columns if c in header]
+        records, numbers = [], []
+        for number, row in enumerate(rows, start=2):
+            if any(cell is not None for cell in row):
+                records.append(tuple(row[i] if i < len(row) else None for i in positions))
+                numbers.append(number)
+    finally:
+        workbook.close()
+
+    data = pd.DataFrame(records, columns=[header[i] for i in positions], index=pd.Index(numbers, dtype="int64"))
+    for column in TEXT_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].map(_cell_text, na_action="ignore").astype(object)
+    return header, data
+
+
+def _cell_text(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _text(series):
+    """Strip cells to text, turning blanks into missing values."""
+    text = series.astype("string").str.strip()
+    return text.mask(text == "")
+
+
+def _digits(series):
+    text = _text(series).str.replace(r"\.0$", "", regex=True).str.replace(r"[\s-]", "", regex=True)
+    return text.str.lstrip("0").mask(lambda s: s == "")
+
+
+def _apply_mappings(plan):
+    """Map sheet values to the labels the portal's dropdowns use."""
+    religion = plan["Religion"].str.lower()
+    plan["Religion"] = (religion.isin(["islam", "muslim"])).map({True: "Muslim", False: "Non Muslim"}).astype("string")
+    disability = plan["Disability"].fillna("NO")
+    plan["Disability"] = disability.mask(disability.str.lower() == "no", "NO")
+    plan["Blood Group"] = plan["Blood Group"].fillna("N/A")
+    plan["Qualification"] = plan["Qualification"].mask(plan["Qualification"].isin(["Primary", "Matric"]), "Matriculation")
+
+
+def prepare(data, vocabularies=None):
+    """Normalise and validate a whole sheet before any browser is started.
+
+    Returns (plan, rejected). plan holds only valid rows, with every value
+    already in the form the bot types or selects (dates as MM/DD/YYYY,
+    numbers as digit strings, dropdown labels mapped) and None for blanks.
+    rejected holds the sheet row number, GR NO and reason for every row that
+    would fail in the portal. Extra vocabularies (field -> allowed values)
+    are checked on top of VOCABULARIES.
+    """
+    data = data.rename(columns=lambda c: str(c).strip())
+    missing_columns = [c for c in PLAN_COLUMNS if c not in data.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {', '.join(missing_columns)}")
+
+    plan = pd.DataFrame({c: _text(data[c]) for c in PLAN_COLUMNS}, index=data.index)
+    reasons = pd.Series("", index=data.index)
+
+    def reject(mask, reason):
+        reasons[mask] = reasons[mask] + reason + "; "
+
+    plan["GR NO"] = plan["GR NO"].str.replace(r"\.0$", "", regex=True)
+    reject(plan["GR NO"].isna(), "GR NO is empty")
+    reject(plan["Admission Type"].isna(), "Admission Type is empty")
+
+    for column in DATE_COLUMNS:
+        parsed = pd.to_datetime(data[column], errors="coerce", format="mixed")
+        reject(plan[column].notna() & parsed.isna(), f"{column} is not a date")
+        plan[column] = parsed.dt.strftime("%m/%d/%Y").astype("string")
+
+    for column, length in DIGIT_COLUMNS.items():
+        digits = _digits(data[column])
+        reject(digits.notna() & ~digits.str.fullmatch(rf"\d{{{length}}}").fillna(False), f"{column} must have {length} digits")
+        plan[column] = digits
+
+    _apply_mappings(plan)
+
+    for admission_type, columns in REQUIRED_COLUMNS.items():
+        of_type = plan["Admission Type"] == admission_type
+        for column in columns:
+            reject(of_type & plan[column].isna(), f"{column} is empty")
+
+    vocabularies = {**VOCABULARIES, **(vocabularies or {})}
+    for column, allowed in vocabularies.items():
+        if column in plan.columns:
+            reject(plan[column].notna() & ~plan[column].isin(list(allowed)), f"{column} not in the portal's list")
+
+    duplicated = plan.duplicated(subset=["GR NO", "Admission Type"], keep="first") & plan["GR NO"].notna()
+    reject(duplicated, "duplicate GR NO for this Admission Type")
+
+    bad = reasons != ""
+    rejected = pd.DataFrame({
+        "Row": data.index[bad],  # Excel row number, kept as the index by read_workbook
+        "GR NO": plan.loc[bad, "GR NO"],
+        "Admission Type": plan.loc[bad, "Admission Type"],
+        "Reason": reasons[bad].str.rstrip("; "),
+    })
+    plan = plan[~bad].astype(object).where(plan[~bad].notna(), None)
+    return plan, rejected
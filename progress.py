@@ -0,0 +1,82 @@
+import time
+import queue
+
+# Set in the worker process by bot._run_with_progress; None when nobody listens.
+_events = None
+
+
+def set_event_queue(events):
+    global _events
+    _events = events
+
+
+def emit(kind: str, **fields):
+    """Send a progress event to the UI, if a run is being watched."""
+    if _events is None:
+        return
+    try:
+        _events.put_nowait({"kind": kind, "ts": time.time(), **fields})
+    except Exception:
+        # Progress is best effort and must never break a row.
+        pass
+
+
+class ProgressTracker:
+    """Accumulates events from a running batch into the numbers the UI shows."""
+
+    def __init__(self):
+        self.total = 0
+        self.pending = 0
+        self.done = 0
+        self.failed = 0
+        self.step = "Starting browser"
+        self.current_gr = None
+        self.started_at = time.time()
+        self.finished = False
+        self.errors = []
+        self.reports = []
+
+    def update(self, event: dict):
+        kind = event["kind"]
+        if kind == "start":
+            self.total = event["total"]
+            self.pending = event["pending"]
+            self.started_at = event["ts"]
+        elif kind == "step":
+            self.step = event["step"]
+            self.current_gr = event.get("gr_no")
+        elif kind == "row":
+            if event["status"] == "done":
+                self.done += 1
+            else:
+                self.failed += 1
+                self.errors.append(f"{event['gr_no']}: {event.get('error')}")
+        elif kind == "report":
+            self.reports.append(event["text"])
+        elif kind == "finished":
+            self.finished = True
+            self.step = "Finished"
+
+    def drain(self, events):
+        """Apply every event waiting on the queue without blocking."""
+        while True:
+            try:
+                self.update(events.get_nowait())
+            except queue.Empty:
+                return
+
+    @property
+    def processed(self):
+        return self.done + self.failed
+
+    @property
+    def rows_per_minute(self):
+        elapsed = time.time() - self.started_at
+        return self.processed / elapsed * 60 if elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self):
+        rate = self.rows_per_minute
+        if not rate:
+            return None
+        return max(self.pending - self.processed, 0) / rate * 60
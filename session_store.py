@@ -0,0 +1,58 @@
+import os
+import json
+import base64
+import hashlib
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "sessions")
+
+SALT_SIZE = 16
+KDF_ITERATIONS = 480000
+
+
+def _session_path(username: str):
+    # Hash the username so the cache directory does not list who uses the bot.
+    digest = hashlib.sha256(username.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(SESSION_DIR, f"{digest}.bin")
+
+
+def _fernet(password: str, salt: bytes):
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(password.encode("utf-8"))))
+
+
+def load_session(username: str, password: str):
+    """Return the cached session for a user, or None if missing or unreadable.
+
+    The file is encrypted with a key derived from the user's password, so a
+    changed password simply invalidates the cache.
+    """
+    try:
+        with open(_session_path(username), "rb") as f:
+            blob = f.read()
+        token = _fernet(password, blob[:SALT_SIZE]).decrypt(blob[SALT_SIZE:])
+        return json.loads(token)
+    except (OSError, InvalidToken, ValueError):
+        return None
+
+
+def save_session(username: str, password: str, session: dict):
+    """Encrypt and store a session (Playwright storage state plus sessionStorage)."""
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    salt = os.urandom(SALT_SIZE)
+    token = _fernet(password, salt).encrypt(json.dumps(session).encode("utf-8"))
+    path = _session_path(username)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(salt + token)
+    os.replace(tmp_path, path)
+
+
+def clear_session(username: str):
+    try:
+        os.remove(_session_path(username))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,173 @@
+import json
+import urllib.request
+from urllib.parse import urlsplit
+
+import pandas as pd
+import pytest
+
+from api_engine import CONFIRMATIONS, ApiEngine, ApiProfile
+from mock_portal import MockPortal
+
+
+@pytest.fixture
+def portal():
+    portal = MockPortal(latency=0)
+    url = portal.start()
+    portal.seed_students(["1001", "1002", "1003"])
+    yield portal, url
+    portal.stop()
+
+
+def sign_in(url):
+    """A saved session (as bot.capture_session returns it) signed in to the mock portal."""
+    request = urllib.request.Request(
+        f"{url}api/login",
+        data=json.dumps({"username": "bench", "password": "bench"}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        token = json.load(response)["token"]
+    cookie = {
+        "name": "session", "value": token, "domain": urlsplit(url).hostname, "path": "/",
+        "expires": -1, "httpOnly": True, "secure": False, "sameSite": "Lax",
+    }
+    return {"storage_state": {"cookies": [cookie], "origins": []}, "session_storage": {"origin": url, "items": {}}}
+
+
+def status_calls(url, student_id, gr_no, body):
+    """What CallRecorder.take returns for a status row filled in the browser."""
+    return [
+        {
+            "method": "GET", "url": f"{url}api/students?search={gr_no}&size=100", "headers": {}, "body": None,
+            "status": 200, "response": [{"id": student_id, "grNo": gr_no, "name": "Student", "statuses": []}],
+        },
+        {
+            "method": "POST", "url": f"{url}api/students/{student_id}/status", "headers": {}, "body": body,
+            "status": 200, "response": None,
+        },
+    ]
+
+
+def promoted(gr_no, section):
+    return {"GR NO": gr_no, "Admission Type": "Promoted", "Select Section": section}
+
+
+@pytest.fixture
+def profile(tmp_path):
+    return ApiProfile("http://127.0.0.1/", path=str(tmp_path / "profile.json"))
+
+
+def test_learn_templates_row_values(profile):
+    profile.learn(promoted("1001", "A"), status_calls("http://127.0.0.1/", 1, "1001", {"status": "Promoted", "section": "A"}), "/student/about/1")
+    action = profile.actions["Promoted"]
+    assert action["url"] == "/api/students/{student_id}/status"
+    assert action["body"] == {
+        "status": {"$column": "Admission Type", "$type": "str"},
+        "section": {"$column": "Select Section", "$type": "str"},
+    }
+    assert profile.lookup == {"url": "/api/students?search={gr_no}&size=100", "gr_key": "grNo", "id_key": "id"}
+
+
+def test_ready_after_confirmations(profile):
+    for gr_no, student_id, section in (("1001", 1, "A"), ("1002", 2, "B")):
+        assert not profile.ready("Promoted")
+        body = {"status": "Promoted", "section": section}
+        profile.learn(promoted(gr_no, section), status_calls("http://127.0.0.1/", student_id, gr_no, body), f"/student/about/{student_id}")
+    assert profile.actions["Promoted"]["confirmations"] == CONFIRMATIONS
+    assert profile.ready("Promoted")
+
+
+def test_constant_body_needs_rows_that_differ(profile):
+    for gr_no, student_id in (("1001", 1), ("1002", 2)):
+        body = {"status": "Promoted", "sectionId": 77}
+        profile.learn(promoted(gr_no, "A"), status_calls("http://127.0.0.1/", student_id, gr_no, body), f"/student/about/{student_id}")
+    assert profile.actions["Promoted"]["confirmations"] == 2
+    assert not profile.ready("Promoted")
+
+    # The same id for section C as for section A: it does not depend on the section.
+    body = {"status": "Promoted", "sectionId": 77}
+    profile.learn(promoted("1003", "C"), status_calls("http://127.0.0.1/", 3, "1003", body), "/student/about/3")
+    assert profile.ready("Promoted")
+
+
+def test_different_constant_starts_over(profile):
+    for gr_no, student_id, section, section_id in (("1001", 1, "A", 77), ("1002", 2, "C", 79)):
+        body = {"status": "Promoted", "sectionId": section_id}
+        profile.learn(promoted(gr_no, section), status_calls("http://127.0.0.1/", student_id, gr_no, body), f"/student/about/{student_id}")
+    assert profile.actions["Promoted"]["confirmations"] == 1
+    assert not profile.ready("Promoted")
+
+
+def test_upload_is_never_ready(profile):
+    row = {"GR NO": "2001", "Admission Type": "New Admission", "Students Name": "Ali"}
+    calls = [
+        {"method": "POST", "url": "http://127.0.0.1/api/upload", "headers": {}, "body": None, "status": 200, "response": None},
+        {"method": "POST", "url": "http://127.0.0.1/api/students", "headers": {}, "body": {"grNo": "2001", "studentName": "Ali"}, "status": 200, "response": None},
+    ]
+    for _ in range(CONFIRMATIONS):
+        profile.learn(row, calls)
+    assert profile.actions["New Admission"]["confirmations"] == CONFIRMATIONS
+    assert not profile.ready("New Admission")
+
+
+def test_save_and_load(profile):
+    profile.learn(promoted("1001", "A"), status_calls("http://127.0.0.1/", 1, "1001", {"status": "Promoted", "section": "A"}), "/student/about/1")
+    profile.save()
+    loaded = ApiProfile("http://127.0.0.1/", path=profile.path)
+    assert loaded.actions == profile.actions
+    assert loaded.lookup == profile.lookup
+
+
+def learned_profile(url, path):
+    profile = ApiProfile(url, path=path)
+    for gr_no, student_id, section in (("1001", 1, "A"), ("1002", 2, "B")):
+        body = {"status": "Promoted", "section": section}
+        profile.learn(promoted(gr_no, section), status_calls(url, student_id, gr_no, body), f"/student/about/{student_id}")
+    for gr_no, student_id in (("1001", 1), ("1002", 2)):
+        profile.learn({"GR NO": gr_no, "Admission Type": "TC"}, status_calls(url, student_id, gr_no, {"status": "TC"}), f"/student/about/{student_id}")
+    return profile
+
+
+def test_run_sends_rows_in_order(portal, tmp_path):
+    portal, url = portal
+    profile = learned_profile(url, str(tmp_path / "profile.json"))
+    rows = pd.DataFrame([
+        {"GR NO": "1003", "Admission Type": "Promoted", "Select Section": "C"},
+        {"GR NO": "1003", "Admission Type": "TC", "Select Section": None},
+        {"GR NO": "1001", "Admission Type": "Promoted", "Select Section": "B"},
+    ], index=[2, 3, 4])
+    engine = ApiEngine(url, profile, sign_in(url), workers=2, rate=0)
+    assert engine.run(rows) == {2: None, 3: None, 4: None}
+    stored = portal.stored_statuses()
+    assert stored.index(("1003", "Promoted")) < stored.index(("1003", "TC"))
+    assert ("1001", "Promoted") in stored
+    student = next(s for s in portal.students.values() if s["grNo"] == "1003")
+    assert student["statuses"][0]["section"] == "C"
+
+
+def test_run_stops_when_session_is_lost(portal, tmp_path):
+    portal, url = portal
+    profile = learned_profile(url, str(tmp_path / "profile.json"))
+    session = sign_in(url)
+    portal.expire_sessions()
+    rows = pd.DataFrame([
+        {"GR NO": "1001", "Admission Type": "Promoted", "Select Section": "A"},
+        {"GR NO": "1001", "Admission Type": "TC", "Select Section": None},
+        {"GR NO": "1002", "Admission Type": "TC", "Select Section": None},
+    ], index=[2, 3, 4])
+    results = ApiEngine(url, profile, session, workers=1, rate=0).run(rows)
+    assert results == {2: "session expired", 3: "session expired", 4: "session expired"}
+    assert portal.stored_statuses() == []
+
+
+def test_run_leaves_failed_rows_and_their_followers(portal, tmp_path):
+    portal, url = portal
+    profile = learned_profile(url, str(tmp_path / "profile.json"))
+    rows = pd.DataFrame([
+        {"GR NO": "9999", "Admission Type": "Promoted", "Select Section": "A"},
+        {"GR NO": "9999", "Admission Type": "TC", "Select Section": None},
+        {"GR NO": "1002", "Admission Type": "TC", "Select Section": None},
+    ], index=[2, 3, 4])
+    results = ApiEngine(url, profile, sign_in(url), workers=1, rate=0).run(rows)
+    assert results[2] is not None and results[3] == results[2]
+    assert results[4] is None
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+import journal
+from journal import FAILED, INTERRUPTED, RESUME, Journal, journal_summary, read_states, row_key
+
+
+@pytest.fixture(autouse=True)
+def runs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "RUNS_DIR", str(tmp_path))
+
+
+@pytest.fixture
+def sheet():
+    return pd.DataFrame({
+        "GR NO": ["1", "2", "3", "4"],
+        "Admission Type": ["Promoted", "TC", "Promoted", "Passout"],
+    }, index=[2, 3, 4, 5])
+
+
+@pytest.fixture
+def run(sheet):
+    j = Journal("run")
+    j.record("1", "Promoted", "started")
+    j.record("1", "Promoted", "done")
+    j.record("2", "TC", "started")
+    j.record("2", "TC", "failed", "timeout")
+    j.record("3", "Promoted", "started")
+    yield j
+    j.close()
+
+
+def test_resume_leaves_out_done_and_interrupted_rows(run, sheet):
+    assert list(run.pending_rows(sheet, RESUME).index) == [3, 5]
+
+
+def test_failed_and_interrupted_selections(run, sheet):
+    assert list(run.pending_rows(sheet, FAILED).index) == [3]
+    assert list(run.pending_rows(sheet, INTERRUPTED).index) == [4]
+
+
+def test_states_survive_a_reopen(run, sheet):
+    run.close()
+    reopened = Journal("run")
+    try:
+        assert reopened.status("2", "TC") == "failed"
+        assert list(reopened.pending_rows(sheet).index) == [3, 5]
+    finally:
+        reopened.close()
+    assert journal_summary("run") == {"done": 1, "failed": 1, "started": 1}
+
+
+def test_torn_last_line_is_ignored(run):
+    run.close()
+    with open(journal.journal_path("run"), "a", encoding="utf-8") as f:
+        f.write('{"key": "4|Passout", "sta')
+    assert row_key("4", "Passout") not in read_states("run")
+
+
+def test_row_key_normalises_float_gr_no():
+    assert row_key(12.0, " TC ") == "12|TC"
@@ -0,0 +1,105 @@
+import io
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+from preflight import PLAN_COLUMNS, prepare, read_workbook
+
+NEW_ADMISSION = {
+    "Admission Type": "New Admission", "Admission Date": "2024-04-01", "GR NO": 1001,
+    "Class Admitted": "I", "Current Class": "I", "Select Section": "A", "Medium": "Urdu",
+    "Shift": "Morning", "Students Name": "Ali", "Student Surname": "Khan",
+    "B-FORM": "42101-1234567-1", "Date Of Birth": datetime(2018, 3, 9), "Gender": "Male",
+    "Religion": "Islam", "Disability": None, "Blood Group": None, "Mother Tongue": "Sindhi",
+    "Emergency Contact Name": "Ahmed", "Emergency Contact Number": "03001234567",
+    "Region": "Karachi", "District": "East", "Taluka": "Gulshan", "Union Coucil": "UC-1",
+    "Cily/Village/Area": "Karachi", "Address": "House 1", "Salutaion": "Mr", "Name": "Ahmed",
+    "Surname": "Khan", "CNIC": 4210112345671, "Mobile No": 3001234567, "Occupation": "Teacher",
+    "Qualification": "Primary",
+}
+
+
+def workbook(*rows):
+    """An .xlsx file with the template header and one sheet row per dict (None for a blank row)."""
+    book = Workbook()
+    sheet = book.active
+    sheet.append(PLAN_COLUMNS)
+    for row in rows:
+        sheet.append([row.get(c) for c in PLAN_COLUMNS] if row is not None else [])
+    content = io.BytesIO()
+    book.save(content)
+    return content.getvalue()
+
+
+def prepared(*rows):
+    return prepare(read_workbook(workbook(*rows))[1])
+
+
+def test_values_are_normalised_for_the_portal():
+    plan, rejected = prepared(NEW_ADMISSION)
+    assert rejected.empty
+    row = plan.iloc[0]
+    assert row["GR NO"] == "1001"
+    assert row["Admission Date"] == "04/01/2024"
+    assert row["Date Of Birth"] == "03/09/2018"
+    assert row["B-FORM"] == "4210112345671"
+    assert row["CNIC"] == "4210112345671"
+    assert row["Emergency Contact Number"] == "3001234567"
+    assert row["Mobile No"] == "3001234567"
+
+
+@pytest.mark.parametrize("column, sheet_value, portal_value", [
+    ("Religion", "islam", "Muslim"),
+    ("Religion", "Christian", "Non Muslim"),
+    ("Disability", None, "NO"),
+    ("Disability", "no", "NO"),
+    ("Disability", "Blind", "Blind"),
+    ("Blood Group", None, "N/A"),
+    ("Blood Group", "B+", "B+"),
+    ("Qualification", "Primary", "Matriculation"),
+    ("Qualification", "Matric", "Matriculation"),
+    ("Qualification", "Graduate", "Graduate"),
+])
+def test_dropdown_mappings(column, sheet_value, portal_value):
+    plan, rejected = prepared({**NEW_ADMISSION, column: sheet_value})
+    assert rejected.empty
+    assert plan.iloc[0][column] == portal_value
+
+
+@pytest.mark.parametrize("column, value, reason", [
+    ("CNIC", "42101-1234", "CNIC must have 13 digits"),
+    ("B-FORM", 12345678901234, "B-FORM must have 13 digits"),
+    ("Mobile No", "0300123456", "Mobile No must have 10 digits"),
+    ("Date Of Birth", "not a date", "Date Of Birth is not a date"),
+    ("Blood Group", "C+", "Blood Group not in the portal's list"),
+    ("Select Section", None, "Select Section is empty"),
+])
+def test_invalid_values_are_rejected(column, value, reason):
+    plan, rejected = prepared({**NEW_ADMISSION, column: value})
+    assert plan.empty
+    assert list(rejected["Reason"]) == [reason]
+
+
+def test_duplicate_gr_no_is_rejected_per_admission_type():
+    promoted = {"Admission Type": "Promoted", "GR NO": 1001, "Select Section": "B"}
+    plan, rejected = prepared(NEW_ADMISSION, promoted, NEW_ADMISSION)
+    assert list(plan["Admission Type"]) == ["New Admission", "Promoted"]
+    assert list(rejected["Row"]) == [4]
+    assert list(rejected["Reason"]) == ["duplicate GR NO for this Admission Type"]
+
+
+def test_rejected_rows_carry_excel_row_numbers_across_blank_rows():
+    bad = {**NEW_ADMISSION, "GR NO": 1002, "CNIC": "123"}
+    plan, rejected = prepared(NEW_ADMISSION, None, None, bad)
+    assert list(plan.index) == [2]
+    assert list(rejected["Row"]) == [5]
+    assert list(rejected["GR NO"]) == ["1002"]
+
+
+def test_prepare_is_idempotent():
+    rows = [NEW_ADMISSION, {"Admission Type": "TC", "GR NO": 1003}]
+    plan, _ = prepared(*rows)
+    again, rejected = prepare(plan)
+    assert rejected.empty
+    assert again.equals(plan)
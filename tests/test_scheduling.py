@@ -0,0 +1,34 @@
+import pandas as pd
+
+from bot import schedule_rows, split_rows
+
+
+def sheet(*rows):
+    return pd.DataFrame(rows, columns=["GR NO", "Admission Type"], index=range(2, len(rows) + 2))
+
+
+def test_rows_are_grouped_by_admission_type():
+    data = sheet(("1", "TC"), ("2", "Promoted"), ("3", "New Admission"), ("4", "Promoted"))
+    assert list(schedule_rows(data).index) == [4, 3, 5, 2]
+
+
+def test_a_gr_nos_later_rows_stay_after_its_first():
+    # GR 1's second row would sort first by type, but must not run before its first.
+    data = sheet(("1", "Promoted"), ("1", "New Admission"), ("2", "Promoted"))
+    order = list(schedule_rows(data).index)
+    assert order.index(2) < order.index(3)
+    assert order == [2, 4, 3]
+
+
+def test_split_keeps_a_gr_no_on_one_worker():
+    data = sheet(("1", "New Admission"), ("2", "New Admission"), ("1", "Promoted"), ("3", "TC"), ("2", "TC"))
+    parts = split_rows(data, 2)
+    assert sum(len(p) for p in parts) == len(data)
+    for part in parts:
+        others = pd.concat([p for p in parts if p is not part])
+        assert not set(part["GR NO"]) & set(others["GR NO"])
+
+
+def test_split_drops_empty_workers():
+    data = sheet(("1", "TC"), ("2", "TC"))
+    assert [len(p) for p in split_rows(data, 8)] == [1, 1]